@@ -29,14 +29,22 @@ echo -e "\n"
 #               #
 #################
 
-#inizialization of the merged_file with the headers
-head -n1 course_1.tsv > merged_courses.tsv
-
-#appending rows to the merged_file
-for file in course*.tsv
-do
-    tail -n1 $file >> merged_courses.tsv
-done
+#if the corpus store (functions/corpus.py) has been created the merged file is written from it in one go by 'corpus.export_tsv',
+#run from the folder of the notebook since the paths of the config file are relative to it
+if (cd ../.. && python3 -c "from functions import corpus; exit(not corpus.corpus_available())") 2> /dev/null
+then
+    tsvs_folder=$(pwd)
+    (cd ../.. && python3 -c "from functions import corpus; corpus.export_tsv('$tsvs_folder/merged_courses.tsv')")
+else
+    #inizialization of the merged_file with the headers
+    head -n1 course_1.tsv > merged_courses.tsv
+
+    #appending rows to the merged_file
+    for file in course*.tsv
+    do
+        tail -n1 $file >> merged_courses.tsv
+    done
+fi
 
 
 #################################
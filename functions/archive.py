@@ -0,0 +1,230 @@
+# import config
+from functions.config import *
+
+# import libraries
+import os
+import zlib
+import contextlib
+
+class PageArchive:
+    '''
+    Append-only archive of the crawled .html pages, used in place of thousands of loose files.
+    The format follows the idea of WARC files: every page is stored as a separate gzip member containing a small header
+    (record type, url, course number and length of the content) followed by the page itself, so the whole archive is still
+    a valid .gz file that can be streamed sequentially. Next to it we keep a text index with one line per record containing
+    course number, offset and compressed length of the record, which gives random access to any course without reading
+    the others. Records are never modified: a newer version of a page is appended and its index line overrides the
+    previous one, a removed page is marked with a 'tombstone' record.
+    With 'read_only' the archive can be opened at the same time by many readers, for example the workers of a process pool.
+    '''
+
+    def __init__(self, path = courses_archive_path, index_path = courses_archive_index_path, read_only = False):
+        self.path = path
+        self.index_path = index_path
+        self.read_only = read_only
+        self.index = {} # course number -> (offset, length) of its last record, None if removed
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        # load the index
+        indexed_end = 0
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as index_file:
+                for line in index_file:
+                    course, offset, length, record_type = line.rstrip('\n').split('\t')
+                    course, offset, length = int(course), int(offset), int(length)
+                    indexed_end = max(indexed_end, offset + length)
+                    self.index[course] = (offset, length) if record_type == "response" else None
+
+        if read_only:
+            self.file = open(path, 'rb')
+            self.index_file = None
+        else:
+            self.file = open(path, 'a+b')
+            self.index_file = open(index_path, 'a')
+
+            # records written after the last index update (for example by an interrupted crawl) are recovered from the archive
+            if os.path.getsize(path) > indexed_end:
+                self._recover(indexed_end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        if self.index_file is not None:
+            self.index_file.close()
+
+    def __contains__(self, course):
+        return self.index.get(course) is not None
+
+    def __len__(self):
+        return sum(1 for entry in self.index.values() if entry is not None)
+
+    def courses(self):
+        '''
+        Return the sorted list of the courses stored in the archive.
+        '''
+
+        return sorted(course for course, entry in self.index.items() if entry is not None)
+
+    def append(self, course, url, html):
+        '''
+        Append a new version of the page of a course.
+        '''
+
+        self._write(course, "response", url, html.encode("utf-8"))
+
+    def remove(self, course):
+        '''
+        Mark the page of a course as removed.
+        '''
+
+        if course in self:
+            self._write(course, "tombstone", "", b"")
+
+    def read(self, course):
+        '''
+        Return the html page of a course, None if the course is not in the archive.
+        '''
+
+        entry = self.index.get(course)
+        if entry is None:
+            return None
+
+        return self._read_record(*entry)
+
+    def read_head(self, course, size):
+        '''
+        Return only the first 'size' bytes of the page of a course, decompressing just the beginning of its record.
+        '''
+
+        entry = self.index.get(course)
+        if entry is None:
+            return None
+
+        offset, length = entry
+        if not self.read_only:
+            self.file.flush()
+        self.file.seek(offset)
+
+        # the header of the record is followed by the page, a few more KB are enough to contain it
+        decompressor = zlib.decompressobj(wbits = 31)
+        _, _, _, content = self._parse(decompressor.decompress(self.file.read(length), size + 4096))
+
+        return content[:size].decode("utf-8", errors = "ignore")
+
+    def items(self):
+        '''
+        Stream sequentially all the pages in the archive, yielding (course, html) pairs in the order they were written.
+        Older versions of a page and removed pages are skipped.
+        '''
+
+        # following the offsets the file is read sequentially, one record at a time
+        entries = sorted((entry, course) for course, entry in self.index.items() if entry is not None)
+        for (offset, length), course in entries:
+            yield course, self._read_record(offset, length)
+
+    def _read_record(self, offset, length):
+        if not self.read_only:
+            self.file.flush()
+        self.file.seek(offset)
+        _, _, _, content = self._parse(zlib.decompress(self.file.read(length), wbits = 31))
+
+        return content.decode("utf-8")
+
+    def _write(self, course, record_type, url, content):
+        header = ("WARC/1.0\r\n"
+                  "WARC-Type: " + record_type + "\r\n"
+                  "WARC-Target-URI: " + url + "\r\n"
+                  "Course-Number: " + str(course) + "\r\n"
+                  "Content-Length: " + str(len(content)) + "\r\n\r\n")
+
+        compressor = zlib.compressobj(wbits = 31) # gzip member
+        record = compressor.compress(header.encode("utf-8") + content + b"\r\n\r\n") + compressor.flush()
+
+        self.file.seek(0, os.SEEK_END)
+        offset = self.file.tell()
+        self.file.write(record)
+        self.file.flush()
+
+        self._add_to_index(course, offset, len(record), record_type)
+
+    def _add_to_index(self, course, offset, length, record_type):
+        self.index[course] = (offset, length) if record_type == "response" else None
+        self.index_file.write(str(course) + "\t" + str(offset) + "\t" + str(length) + "\t" + record_type + "\n")
+        self.index_file.flush()
+
+    def _parse(self, data):
+        header, content = data.split(b"\r\n\r\n", 1)
+
+        fields = {}
+        for line in header.decode("utf-8").split("\r\n")[1:]:
+            name, value = line.split(": ", 1) if ": " in line else (line.rstrip(":"), "")
+            fields[name] = value
+
+        length = int(fields["Content-Length"])
+        return fields["WARC-Type"], int(fields["Course-Number"]), fields["WARC-Target-URI"], content[:length]
+
+    def _scan(self, start):
+        '''
+        Read the archive from 'start' yielding (offset, compressed length, record) for every complete gzip member.
+        '''
+
+        with open(self.path, 'rb') as file:
+            file.seek(start)
+            buffer = file.read()
+
+        position = 0
+        while position < len(buffer):
+            decompressor = zlib.decompressobj(wbits = 31)
+            try:
+                data = decompressor.decompress(buffer[position:])
+            except zlib.error:
+                return
+            if not decompressor.eof: # truncated record at the end of the archive
+                return
+
+            length = len(buffer) - position - len(decompressor.unused_data)
+            yield start + position, length, data
+            position += length
+
+    def _recover(self, start):
+        end = start
+        for offset, length, data in self._scan(start):
+            record_type, course, _, _ = self._parse(data)
+            self._add_to_index(course, offset, length, record_type)
+            end = offset + length
+
+        # drop a partially written record, new records must start from a valid position
+        if os.path.getsize(self.path) > end:
+            self.file.truncate(end)
+
+def open_archive(use_archive, read_only = False):
+    '''
+    Open the archive of the html pages if 'use_archive' is True. Otherwise returns an empty context that gives None,
+    so the same 'with' block works for both the archive and the loose .html files.
+    '''
+
+    if use_archive:
+        return PageArchive(read_only = read_only)
+
+    return contextlib.nullcontext()
+
+def pack_html_files():
+    '''
+    Move into the archive the pages already downloaded as loose .html files, courses already in the archive are skipped.
+    '''
+
+    with open(courses_urls_path, 'r') as courses_file, PageArchive() as page_archive:
+        for i, url in enumerate(courses_file):
+            course_file_path = courses_pages_path + "page_" + str(1 + i // courses_per_page) + "/" + "course_" + str(1 + i % courses_per_page) + ".html"
+
+            if 1 + i not in page_archive and os.path.exists(course_file_path):
+                with open(course_file_path, 'r', encoding = "utf-8") as html_file:
+                    page_archive.append(1 + i, url.strip("\n"), html_file.read())
@@ -0,0 +1,84 @@
+'''
+This module contains the batch version of 'engine.search_engine' and 'engine.top_k_documents', for the jobs running
+many queries at once. All the queries are preprocessed together in the main process, and the ones with the same
+preprocessed words are evaluated only once. The distinct queries are divided in chunks shared among a pool of processes:
+every process loads the indexes only once, when it starts, and then evaluates all the chunks it receives. The results
+are given back in the order of the input queries, one dataframe for every query, as the ones of the single query
+functions.
+'''
+
+# import config
+from functions.config import *
+from functions import engine
+from functions import binary_index
+
+# import libraries
+import concurrent.futures
+from tqdm.notebook import tqdm
+
+# indexes loaded by every process of the pool (see '_load_indexes')
+_indexes = None
+
+def batch_search_engine(queries, all_rows = False, parallel = True, n_workers = None, chunk_size = 64, text_paths = None, binary_folder = None):
+    '''
+    Return the dataframes of 'engine.search_engine' for all the queries, in their order.
+    The indexes are read from the text files in 'text_paths' (by default the ones in the config file), or from the binary
+    files in 'binary_folder' if given (see 'binary_index.py'), which the processes share through the memory map.
+    With 'parallel' the distinct queries are divided in chunks of 'chunk_size' queries shared among 'n_workers' processes
+    (by default one for every core), otherwise they are evaluated in this process.
+    '''
+
+    # the documents depend only on the set of words of the query, as in 'engine.search_engine'
+    return _run_batch(queries, lambda words: tuple(sorted(set(words))), ("search_engine", all_rows), parallel, n_workers, chunk_size, text_paths, binary_folder)
+
+def batch_top_k_documents(queries, k = 5, pruning = True, parallel = True, n_workers = None, chunk_size = 64, text_paths = None, binary_folder = None):
+    '''
+    Return the dataframes of 'engine.top_k_documents' for all the queries, in their order. The other parameters are the
+    same of 'batch_search_engine'.
+    '''
+
+    # the query vector depends on the order of the words, as in 'engine.top_k_documents'
+    return _run_batch(queries, tuple, ("top_k_documents", k, pruning), parallel, n_workers, chunk_size, text_paths, binary_folder)
+
+def _run_batch(queries, key_function, task, parallel, n_workers, chunk_size, text_paths, binary_folder):
+    # preprocess every distinct query string once, and evaluate every distinct key once
+    texts = list(dict.fromkeys(queries))
+    keys = dict(zip(texts, (key_function(words) for words in engine.analyzer.analyze_many(texts))))
+    distinct = list(dict.fromkeys(keys.values()))
+
+    chunks = [(task, distinct[i:i + chunk_size]) for i in range(0, len(distinct), chunk_size)]
+    results = []
+    if parallel == False:
+        _load_indexes(text_paths, binary_folder)
+        for chunk in tqdm(chunks):
+            results += _evaluate_chunk(chunk)
+
+    else:
+        with concurrent.futures.ProcessPoolExecutor(n_workers, initializer = _load_indexes, initargs = (text_paths, binary_folder)) as executor:
+            for chunk_results in tqdm(executor.map(_evaluate_chunk, chunks), total = len(chunks)):
+                results += chunk_results
+
+    # the same query can appear many times, every occurrence gets its own copy of the result
+    results = dict(zip(distinct, results))
+    return [results[keys[query]].copy() for query in queries]
+
+def _load_indexes(text_paths, binary_folder):
+    # run once in every process of the pool
+    global _indexes
+
+    if binary_folder is not None:
+        _indexes = binary_index.open_binary_index(binary_folder)
+    else:
+        _indexes = engine.load_indexes(text_paths)
+
+def _evaluate_chunk(chunk):
+    # evaluate the preprocessed queries of a chunk with the indexes of this process
+    (name, *options), keys = chunk
+    vocabulary, inverted_index, inverted_index_tfidf = _indexes
+
+    if name == "search_engine":
+        all_rows, = options
+        return [engine._search_engine(list(words), vocabulary, inverted_index, all_rows) for words in keys]
+
+    k, pruning = options
+    return [engine._top_k_documents(' '.join(words), vocabulary, inverted_index, inverted_index_tfidf, k, pruning) for words in keys]
@@ -0,0 +1,612 @@
+'''
+This module contains the binary version of vocabulary, inverted index and inverted index tfidf. Every one of them is a
+single file opened with mmap: loading it costs almost nothing and the operating system reads from the disk only the
+parts actually used by the queries, instead of parsing the whole text file.
+- vocabulary: the terms sorted by their utf-8 bytes with their term ids, searched with a binary search
+- inverted index: tables with the position of the list of every term id, followed by the doc ids of all the lists
+  compressed as differences between consecutive ids written in variable length (see 'encode_doc_ids')
+- inverted index tfidf: as the inverted index, with the scores stored after the doc ids, and its forward index (see
+  'engine.ForwardIndex') in a file next to it
+- impact index (optional, see 'write_impact_index'): the inverted index tfidf with the contributions of the terms to the
+  cosine similarity quantized to 8 bits and every list sorted by them, so that the ranking can stop reading the lists
+  early (see 'ImpactIndex.top_k')
+The opened files behave like the dictionaries loaded by 'engine.load_vocabulary' and 'engine.load_inverted_index', so
+they can be given to all the functions of the engine.
+'''
+
+# import config
+from functions.config import *
+from functions import engine
+from functions import cache
+
+# import libraries
+import os
+import mmap
+import struct
+import contextlib
+import heapq
+import numpy as np
+from array import array
+
+# first bytes of every file, followed by the version of the format and the number of entries
+vocabulary_magic = b"ADMV"
+postings_magic = b"ADMP"
+tfidf_magic = b"ADMT"
+impact_magic = b"ADMI"
+forward_magic = b"ADMF"
+format_version = 2
+header = struct.Struct("<4sII")
+# followed, in the impact index, by the number of doc ids
+impact_header = struct.Struct("<Q")
+# followed, in the forward index, by the number of term ids and the number of (doc id, term id) pairs
+forward_header = struct.Struct("<QQ")
+
+class _MappedFile:
+    def __init__(self, file_path, magic):
+        with open(file_path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        file_magic, version, self.size = header.unpack_from(self.buffer, 0)
+        if file_magic != magic or version != format_version:
+            self.buffer.close()
+            raise ValueError(file_path + " is not a binary index file of version " + str(format_version))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.buffer.close()
+
+    def _array(self, dtype, count, offset):
+        return np.frombuffer(self.buffer, dtype = dtype, count = count, offset = offset)
+
+class BinaryVocabulary(_MappedFile):
+    '''
+    Vocabulary opened from its binary file, used as the dictionary term -> term id.
+    '''
+
+    def __init__(self, file_path):
+        super().__init__(file_path, vocabulary_magic)
+
+        n = self.size
+        self.term_ids = self._array("<u4", n, header.size)
+        self.offsets = self._array("<u8", n + 1, header.size + 4 * n)
+        self.terms_start = header.size + 4 * n + 8 * (n + 1)
+
+    def _term(self, i):
+        return self.buffer[self.terms_start + int(self.offsets[i]):self.terms_start + int(self.offsets[i + 1])]
+
+    def _position(self, word):
+        # binary search of the word among the sorted terms
+        key = word.encode("utf-8")
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size and self._term(low) == key:
+            return low
+        return None
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        return self._position(word) is not None
+
+    def __getitem__(self, word):
+        position = self._position(word)
+        if position is None:
+            raise KeyError(word)
+        return int(self.term_ids[position])
+
+    def get(self, word, default = None):
+        position = self._position(word)
+        return default if position is None else int(self.term_ids[position])
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self._term(i).decode("utf-8")
+
+    def items(self):
+        for i in range(self.size):
+            yield self._term(i).decode("utf-8"), int(self.term_ids[i])
+
+class BinaryInvertedIndex(_MappedFile):
+    '''
+    Inverted index (or inverted index tfidf) opened from its binary file, used as the dictionary term id -> list.
+    The lists are decoded only when requested and given in the same form of 'engine.load_inverted_index': an array of doc
+    ids, or a pair of arrays (doc ids, scores) for the inverted index tfidf. The inverted index tfidf also opens its forward
+    index, in 'forward_index' as for 'engine.InvertedIndexTfidf'.
+    '''
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as file:
+            self.with_scores = file.read(4) == tfidf_magic
+        super().__init__(file_path, tfidf_magic if self.with_scores else postings_magic)
+
+        # the tables have an entry for every term id from 0 to the largest one: the list of term id t has the documents from
+        # counts[t] to counts[t + 1], encoded in the bytes from offsets[t] to offsets[t + 1]
+        n = self.size
+        self.counts = self._array("<u8", n + 1, header.size)
+        self.offsets = self._array("<u8", n + 1, header.size + 8 * (n + 1))
+        self.docs_start = header.size + 16 * (n + 1)
+        if self.with_scores:
+            total = int(self.counts[-1])
+            self.scores = self._array("<f8", total, self.docs_start + _padded(int(self.offsets[-1])))
+
+            # files written before the forward index was written with them get it built from the lists
+            forward_path = forward_index_path(file_path)
+            if os.path.exists(forward_path):
+                self.forward_index = BinaryForwardIndex(forward_path)
+            if not os.path.exists(forward_path) or len(self.forward_index.scores) != total:
+                self.forward_index = engine.build_forward_index(self)
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.counts)))
+
+    def __contains__(self, term_id):
+        return 0 <= term_id < self.size and self.counts[term_id + 1] > self.counts[term_id]
+
+    def document_frequency(self, term_id):
+        '''
+        Number of documents of a term, read from the tables without decoding its list.
+        '''
+
+        return int(self.counts[term_id + 1] - self.counts[term_id]) if term_id in self else 0
+
+    def postings(self, term_id):
+        '''
+        Return the doc ids (and the scores for the inverted index tfidf) of a term as numpy arrays.
+        '''
+
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        docs = decode_doc_ids(self._array(np.uint8, end - start, self.docs_start + start))
+        if self.with_scores:
+            return docs, self.scores[int(self.counts[term_id]):int(self.counts[term_id + 1])]
+        return docs
+
+    def __getitem__(self, term_id):
+        if term_id not in self:
+            raise KeyError(term_id)
+
+        if self.with_scores:
+            docs, scores = self.postings(term_id)
+            return _to_array('I', docs), _to_array('d', scores)
+        return _to_array('I', self.postings(term_id))
+
+    def get(self, term_id, default = None):
+        return self[term_id] if term_id in self else default
+
+    def __iter__(self):
+        return (term_id for term_id in range(self.size) if term_id in self)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for term_id in self:
+            yield term_id, self[term_id]
+
+class BinaryForwardIndex(_MappedFile, engine.ForwardIndex):
+    '''
+    Forward index of an inverted index tfidf opened from its binary file (see 'write_forward_index').
+    '''
+
+    def __init__(self, file_path):
+        super().__init__(file_path, forward_magic)
+
+        n = self.size
+        n_terms, total = forward_header.unpack_from(self.buffer, header.size)
+        start = header.size + forward_header.size
+        self.doc_starts = self._array("<i8", n + 1, start)
+        self.doc_norms = self._array("<f8", n, start + 8 * (n + 1))
+        self.max_scores = self._array("<f8", n_terms, start + 8 * (2 * n + 1))
+        self.scores = self._array("<f8", total, start + 8 * (2 * n + 1 + n_terms))
+        self.term_ids = self._array("<u4", total, start + 8 * (2 * n + 1 + n_terms + total))
+
+class ImpactIndex(_MappedFile):
+    '''
+    Impact-ordered index opened from its binary file (see 'write_impact_index'). The list of every term is split in
+    segments of documents with the same impact, from the highest to the lowest, so that 'top_k' reads the segments of
+    all the query terms by decreasing impact and stops as soon as the segments left cannot change the first k documents.
+    Every list is also kept sorted by doc id, to find the impacts of a document in the lists of the other terms.
+    '''
+
+    def __init__(self, file_path):
+        super().__init__(file_path, impact_magic)
+
+        # term id t has contributions low[t] + impact * scale[t], the segments from term_segments[t] to term_segments[t + 1]
+        # and the postings (sorted by doc id) from term_postings[t] to term_postings[t + 1]; the doc ids of segment s are
+        # encoded in the bytes from segment_offsets[s] to segment_offsets[s + 1]
+        n = self.size
+        self.n_docs, = impact_header.unpack_from(self.buffer, header.size)
+        start = header.size + impact_header.size
+        self.low = self._array("<f8", n, start)
+        self.scale = self._array("<f8", n, start + 8 * n)
+        self.term_segments = self._array("<u8", n + 1, start + 16 * n)
+        self.term_postings = self._array("<u8", n + 1, start + 16 * n + 8 * (n + 1))
+        m, p = int(self.term_segments[-1]), int(self.term_postings[-1])
+        start += 16 * n + 16 * (n + 1)
+        self.segment_offsets = self._array("<u8", m + 1, start)
+        self.doc_ids = self._array("<u4", p, start + 8 * (m + 1))
+        self.doc_impacts = self._array(np.uint8, p, start + 8 * (m + 1) + 4 * p)
+        self.segment_impacts = self._array(np.uint8, m, start + 8 * (m + 1) + 5 * p)
+        self.docs_start = start + 8 * (m + 1) + 5 * p + m
+
+        # number of doc ids read in order of impact by the last call of 'top_k'
+        self.postings_read = 0
+
+    def __contains__(self, term_id):
+        return 0 <= term_id < self.size and self.term_segments[term_id + 1] > self.term_segments[term_id]
+
+    def segment_docs(self, segment):
+        '''
+        Return the doc ids of a segment as a numpy array.
+        '''
+
+        start, end = int(self.segment_offsets[segment]), int(self.segment_offsets[segment + 1])
+        return decode_doc_ids(self._array(np.uint8, end - start, self.docs_start + start))
+
+    def impacts(self, term_id, docs):
+        '''
+        Return the impacts of a term in the (sorted) documents 'docs', and which of them contain the term at all.
+        '''
+
+        start, end = int(self.term_postings[term_id]), int(self.term_postings[term_id + 1])
+        positions = start + np.searchsorted(self.doc_ids[start:end], docs)
+        found = positions < end
+        found[found] = self.doc_ids[positions[found]] == docs[found]
+        return self.doc_impacts[np.minimum(positions, max(end - 1, 0))], found
+
+    def top_k(self, query_terms, k = 5):
+        '''
+        Return the (doc id, score) pairs of the first 'k' documents (all of them if k = "all") containing all the terms of
+        'query_terms' (dictionary term id -> weight, e.g. the number of times the term is in the query), by decreasing
+        score and then increasing doc id. The score is the cosine similarity between the weights and the document, with
+        the quantized contributions: the ranking is exact for them.
+        The segments are read from the highest weight * impact; every new document is scored at once with its impacts in
+        the other lists (and dropped if a term is missing), and the reading stops when a document made of the next
+        impacts of all the terms could not beat the k-th score (threshold algorithm).
+        '''
+
+        self.postings_read = 0
+        terms = list(query_terms)
+        if (k != "all" and k <= 0) or len(terms) == 0 or any(term_id not in self for term_id in terms):
+            return []
+
+        positions = [int(self.term_segments[term_id]) for term_id in terms]
+        ends = [int(self.term_segments[term_id + 1]) for term_id in terms]
+
+        def contribution(i, impacts):
+            # weight times the contribution of term i without its lowest one (that is the same for every document)
+            return query_terms[terms[i]] * (impacts * float(self.scale[terms[i]]))
+
+        seen = np.zeros(self.n_docs, dtype = bool)
+        heap = [] # the k best (score, -doc id) so far, the worst on top
+        results = []
+        while True:
+            # highest contribution that every term can still give (None when its list is over)
+            bounds = [contribution(i, int(self.segment_impacts[positions[i]])) if positions[i] < ends[i] else None for i in range(len(terms))]
+            if any(bound is None for bound in bounds):
+                # no document left can have all the terms
+                break
+            if k != "all" and len(heap) == k and sum(bounds) < heap[0][0]:
+                break
+
+            i = max(range(len(terms)), key = lambda i: bounds[i])
+            docs = self.segment_docs(positions[i]).astype(np.int64)
+            self.postings_read += len(docs)
+            positions[i] += 1
+
+            docs = docs[~seen[docs]]
+            seen[docs] = True
+
+            # impacts of the new documents in all the lists, the ones without a term are dropped
+            impacts = []
+            for j in range(len(terms)):
+                if j == i:
+                    impacts.append(np.full(len(docs), self.segment_impacts[positions[i] - 1]))
+                    continue
+                term_impacts, found = self.impacts(terms[j], docs)
+                docs = docs[found]
+                impacts = [values[found] for values in impacts] + [term_impacts[found]]
+
+            scores = np.zeros(len(docs))
+            for j in range(len(terms)):
+                scores = scores + contribution(j, impacts[j].astype(np.float64))
+
+            if k == "all":
+                results += zip(scores.tolist(), (-docs).tolist())
+                continue
+            for score, doc_id in zip(scores.tolist(), docs.tolist()):
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -doc_id))
+                elif (score, -doc_id) > heap[0]:
+                    heapq.heapreplace(heap, (score, -doc_id))
+
+        ranked = sorted(results if k == "all" else heap, reverse = True)
+
+        # add back the lowest contributions
+        offset = sum(query_terms[term_id] * float(self.low[term_id]) for term_id in terms)
+        norm = np.sqrt(sum(query_terms[term_id] ** 2 for term_id in terms))
+        return [(-doc_id, float((score + offset) / norm)) for score, doc_id in ranked]
+
+def _to_array(typecode, values):
+    # copy of a numpy array in a python array, 'I' for the doc ids and 'd' for the scores
+    result = array(typecode)
+    result.frombytes(np.ascontiguousarray(values, dtype = np.uint32 if typecode == 'I' else np.float64).tobytes())
+    return result
+
+def _padded(size):
+    # the scores start at a multiple of 8 bytes
+    return (size + 7) // 8 * 8
+
+def encode_doc_ids(docs):
+    '''
+    Encode a sorted array of doc ids as the differences between consecutive ids (the first one from 0), every difference
+    written as a varint: 7 bits for every byte, with the highest bit set on all the bytes but the last one.
+    '''
+
+    deltas = np.diff(np.asarray(docs, dtype = np.uint64), prepend = np.uint64(0))
+    n_bytes = np.ones(len(deltas), dtype = np.int64)
+    for k in range(1, 10):
+        n_bytes += deltas >= np.uint64(1 << (7 * k))
+
+    starts = np.cumsum(n_bytes) - n_bytes
+    encoded = np.zeros(int(n_bytes.sum()), dtype = np.uint8)
+    for k in range(int(n_bytes.max(initial = 0))):
+        mask = n_bytes > k
+        value = (deltas[mask] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        continuation = np.where(n_bytes[mask] > k + 1, 0x80, 0)
+        encoded[starts[mask] + k] = value.astype(np.uint8) | continuation.astype(np.uint8)
+
+    return encoded
+
+def decode_doc_ids(encoded):
+    '''
+    Inverse of 'encode_doc_ids', returns the doc ids as a numpy array.
+    '''
+
+    if len(encoded) == 0:
+        return np.zeros(0, dtype = np.uint32)
+
+    # every byte belongs to the value ended by the next byte without the highest bit
+    ends = (encoded & 0x80) == 0
+    value_index = np.cumsum(ends) - ends
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    shifts = 7 * (np.arange(len(encoded)) - starts[value_index])
+
+    # the doc ids fit in 32 bits, so the sum of the parts of every value is exact also as a float
+    parts = ((encoded & 0x7f).astype(np.uint64) << shifts.astype(np.uint64)).astype(np.float64)
+    deltas = np.bincount(value_index, weights = parts, minlength = int(ends.sum())).astype(np.uint64)
+
+    return np.cumsum(deltas).astype(np.uint32)
+
+def write_vocabulary(vocabulary, file_path):
+    '''
+    Write a vocabulary (dictionary term -> term id) in the binary format.
+    '''
+
+    terms = sorted((word.encode("utf-8"), term_id) for word, term_id in vocabulary.items())
+    offsets = np.zeros(len(terms) + 1, dtype = "<u8")
+    offsets[1:] = np.cumsum([len(word) for word, _ in terms])
+
+    with _atomic_file(file_path) as file:
+        file.write(header.pack(vocabulary_magic, format_version, len(terms)))
+        file.write(np.array([term_id for _, term_id in terms], dtype = "<u4").tobytes())
+        file.write(offsets.tobytes())
+        file.write(b"".join(word for word, _ in terms))
+
+def write_forward_index(forward_index, file_path):
+    '''
+    Write a forward index (see 'engine.ForwardIndex') in the binary format: the arrays one after the other.
+    '''
+
+    n = len(forward_index.doc_norms)
+    with _atomic_file(file_path) as file:
+        file.write(header.pack(forward_magic, format_version, n))
+        file.write(forward_header.pack(len(forward_index.max_scores), len(forward_index.scores)))
+        file.write(np.asarray(forward_index.doc_starts, dtype = "<i8").tobytes())
+        file.write(np.asarray(forward_index.doc_norms, dtype = "<f8").tobytes())
+        file.write(np.asarray(forward_index.max_scores, dtype = "<f8").tobytes())
+        file.write(np.asarray(forward_index.scores, dtype = "<f8").tobytes())
+        file.write(np.asarray(forward_index.term_ids, dtype = "<u4").tobytes())
+
+def forward_index_path(inverted_index_tfidf_path):
+    '''
+    Path of the forward index of a binary inverted index tfidf, next to its file.
+    '''
+
+    return os.path.splitext(inverted_index_tfidf_path)[0] + "_forward.bin"
+
+def write_inverted_index(inverted_index, file_path):
+    '''
+    Write an inverted index or an inverted index tfidf (dictionary term id -> list, as returned by 'engine.load_inverted_index'
+    or 'engine.build_indexes') in the binary format. The doc ids are compressed by 'encode_doc_ids', the scores are kept
+    as 8 bytes floats so they are the same of the text files. The forward index of an inverted index tfidf is written
+    next to it by 'write_forward_index'.
+    '''
+
+    size = max(inverted_index.keys(), default = -1) + 1
+    with_scores = any(isinstance(postings, tuple) for postings in inverted_index.values())
+
+    encoded = [np.zeros(0, dtype = np.uint8)] * size
+    scores = [np.zeros(0, dtype = "<f8")] * size
+    counts = np.zeros(size + 1, dtype = "<u8")
+    offsets = np.zeros(size + 1, dtype = "<u8")
+    for term_id, postings in inverted_index.items():
+        docs = postings[0] if with_scores else postings
+        encoded[term_id] = encode_doc_ids(docs)
+        counts[term_id + 1] = len(docs)
+        offsets[term_id + 1] = len(encoded[term_id])
+        if with_scores:
+            scores[term_id] = np.asarray(postings[1], dtype = "<f8")
+    counts = np.cumsum(counts, dtype = "<u8")
+    offsets = np.cumsum(offsets, dtype = "<u8")
+
+    with _atomic_file(file_path) as file:
+        file.write(header.pack(tfidf_magic if with_scores else postings_magic, format_version, size))
+        file.write(counts.tobytes())
+        file.write(offsets.tobytes())
+        file.write(b"".join(docs.tobytes() for docs in encoded))
+        if with_scores:
+            file.write(b"\0" * (_padded(int(offsets[-1])) - int(offsets[-1])))
+            file.write(b"".join(term_scores.tobytes() for term_scores in scores))
+
+    if with_scores:
+        write_forward_index(engine.get_forward_index(inverted_index)[0], forward_index_path(file_path))
+
+def write_impact_index(inverted_index_tfidf, folder = binary_index_path):
+    '''
+    Write the impact-ordered version of an inverted index tfidf in 'folder'. The impact of a term in a document is its
+    contribution to the cosine similarity (see 'engine.term_impacts') quantized to 8 bits between the lowest and
+    the highest contribution of the term. The list of every term is written in segments of documents with the same
+    impact, from the highest impact to the lowest, with the doc ids of every segment compressed by 'encode_doc_ids', and
+    once more sorted by doc id with the impacts.
+    '''
+
+    _, doc_norms = engine.get_forward_index(inverted_index_tfidf)
+    impacts = {term_id: engine.term_impacts(*inverted_index_tfidf[term_id], doc_norms) for term_id in inverted_index_tfidf.keys()}
+    size = max(impacts.keys(), default = -1) + 1
+    n_docs = 1 + max((int(np.max(inverted_index_tfidf[term_id][0])) for term_id in impacts), default = 0)
+
+    low = np.zeros(size, dtype = "<f8")
+    scale = np.ones(size, dtype = "<f8")
+    term_segments = np.zeros(size + 1, dtype = "<u8")
+    term_postings = np.zeros(size + 1, dtype = "<u8")
+    segment_offsets = [0]
+    segment_impacts = []
+    encoded = []
+    doc_ids = []
+    doc_impacts = []
+    for term_id in sorted(impacts):
+        docs = np.asarray(inverted_index_tfidf[term_id][0], dtype = np.int64)
+        low[term_id], high = impacts[term_id].min(), impacts[term_id].max()
+        if high > low[term_id]:
+            scale[term_id] = (high - low[term_id]) / 255
+        quantized = np.rint((impacts[term_id] - low[term_id]) / scale[term_id]).astype(np.int64)
+        doc_ids.append(docs.astype("<u4"))
+        doc_impacts.append(quantized.astype(np.uint8))
+        term_postings[term_id + 1] = len(docs)
+
+        # by decreasing impact and, inside a segment, by doc id
+        order = np.lexsort((docs, -quantized))
+        docs, quantized = docs[order], quantized[order]
+        bounds = np.flatnonzero(np.diff(quantized)) + 1
+        for segment_docs, segment_impact in zip(np.split(docs, bounds), quantized[np.concatenate(([0], bounds))]):
+            encoded.append(encode_doc_ids(segment_docs))
+            segment_offsets.append(segment_offsets[-1] + len(encoded[-1]))
+            segment_impacts.append(segment_impact)
+        term_segments[term_id + 1] = len(segment_impacts)
+
+    # the terms without a list have no segments
+    term_segments = np.maximum.accumulate(term_segments)
+    term_postings = np.cumsum(term_postings, dtype = "<u8")
+
+    with _atomic_file(impact_path(folder)) as file:
+        file.write(header.pack(impact_magic, format_version, size))
+        file.write(impact_header.pack(n_docs))
+        file.write(low.tobytes())
+        file.write(scale.tobytes())
+        file.write(term_segments.tobytes())
+        file.write(term_postings.tobytes())
+        file.write(np.array(segment_offsets, dtype = "<u8").tobytes())
+        file.write(b"".join(docs.tobytes() for docs in doc_ids))
+        file.write(b"".join(values.tobytes() for values in doc_impacts))
+        file.write(np.array(segment_impacts, dtype = np.uint8).tobytes())
+        file.write(b"".join(docs.tobytes() for docs in encoded))
+
+@contextlib.contextmanager
+def _atomic_file(file_path):
+    # the file is written under a temporary name and renamed at the end, readers never see a partial index
+    folder = os.path.dirname(file_path)
+    if folder:
+        os.makedirs(folder, exist_ok = True)
+
+    try:
+        with open(file_path + ".tmp", 'wb') as file:
+            yield file
+    except BaseException:
+        os.remove(file_path + ".tmp")
+        raise
+    os.replace(file_path + ".tmp", file_path)
+
+def binary_paths(folder = binary_index_path):
+    '''
+    Paths of the binary vocabulary, inverted index and inverted index tfidf inside a folder.
+    '''
+
+    return (os.path.join(folder, "vocabulary.bin"), os.path.join(folder, "inverted_index.bin"), os.path.join(folder, "inv_index_tfidf.bin"))
+
+# the cached query results are dropped when the binary files are written again
+cache.result_cache.watch(binary_paths())
+
+def convert_text_index(text_paths = None, folder = binary_index_path):
+    '''
+    Convert the text files of vocabulary, inverted index and inverted index tfidf (by default the ones in the config file)
+    to the binary format, in 'folder'. For the indexes of question 5 use 'bonus.index_paths(t)' and a folder for every type.
+    '''
+
+    if text_paths is None:
+        text_paths = (vocabulary_file_path, inv_index_file_path, inv_ind_tfidf_file_path)
+
+    write_binary_index((engine.load_vocabulary(text_paths[0]), engine.load_inverted_index(text_paths[1]), engine.load_inverted_index(text_paths[2])), folder)
+
+    print("Binary index successfully created!")
+
+def write_binary_index(indexes, folder = binary_index_path):
+    '''
+    Write the (vocabulary, inverted index, inverted index tfidf) dictionaries, for example the ones returned by
+    'engine.build_indexes', in the binary format.
+    '''
+
+    vocabulary, inverted_index, inv_index_tfidf = indexes
+    vocabulary_path, inverted_index_path, inverted_index_tfidf_path = binary_paths(folder)
+
+    write_vocabulary(vocabulary, vocabulary_path)
+    write_inverted_index(inverted_index, inverted_index_path)
+    write_inverted_index(inv_index_tfidf, inverted_index_tfidf_path)
+
+def open_binary_index(folder = binary_index_path):
+    '''
+    Open vocabulary, inverted index and inverted index tfidf from a folder written by 'convert_text_index'.
+    They take the place of the three dictionaries loaded from the text files.
+    '''
+
+    vocabulary_path, inverted_index_path, inverted_index_tfidf_path = binary_paths(folder)
+    return BinaryVocabulary(vocabulary_path), BinaryInvertedIndex(inverted_index_path), BinaryInvertedIndex(inverted_index_tfidf_path)
+
+def impact_path(folder = binary_index_path):
+    '''
+    Path of the impact index inside a folder.
+    '''
+
+    return os.path.join(folder, "impact_index.bin")
+
+def open_impact_index(folder = binary_index_path):
+    '''
+    Open the impact index written by 'write_impact_index' in a folder.
+    '''
+
+    return ImpactIndex(impact_path(folder))
+
+def impact_top_k(query, vocabulary, impact_index, k = 5):
+    '''
+    Return the (doc id, score) pairs of the first 'k' documents of a query with the impact index, every word of the query
+    weighted by the number of times it appears. As in the engine, only the documents with all the words are returned.
+    '''
+
+    query_terms = {}
+    for w in engine.analyzer.analyze(query):
+        term_id = vocabulary.get(w)
+        if term_id is None:
+            return []
+        query_terms[term_id] = query_terms.get(term_id, 0) + 1
+
+    return impact_index.top_k(query_terms, k)
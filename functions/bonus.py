@@ -1,6 +1,8 @@
 # import config
 from functions.config import *
 from functions import engine
+from functions import corpus
+from functions import cache
 
 # import libraries
 import pandas as pd
@@ -9,7 +11,30 @@ from tqdm.notebook import tqdm
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 import heapq
+
+# column of the corpus used by every type of search (1:description 2:course name 3:university name 4:university city)
+field_columns = {1: "description", 2: "courseName", 3: "universityName", 4: "city"}
     
+def index_paths(t):
+    '''
+    Paths of vocabulary, inverted index and inverted index tfidf of a type of search.
+    '''
+
+    return (data_folder_path + "vocabulary_type" + str(t) + ".txt",
+            data_folder_path + "inv_index_type" + str(t) + ".txt",
+            data_folder_path + "inv_index_tfidf_type" + str(t) + ".txt")
+
+# the cached query results are dropped when the indexes of any type of search are created again
+cache.result_cache.watch([path for t in field_columns for path in index_paths(t)])
+
+def generalized_create_indexes(t):
+    '''
+    Create vocabulary, inverted index and inverted index tfidf of a type of search in a single pass, with 'engine.create_indexes'.
+    '''
+
+    print("Creating indexes type " + str(t) + "...")
+    engine.create_indexes(field_columns[t], index_paths(t))
+
 def generalized_create_vocabulary(t):
     '''
     Works the same as the one described in 'engine.py' but generalized for all the fields needed in question 5.
@@ -17,45 +42,8 @@ def generalized_create_vocabulary(t):
 
     print("Creating vocabulary type " + str(t) + "..." )
 
-    # start an empty dictionary
-    vocabulary = {}
-
-    # start with term_id as 1
-    term_id = 1
-
-    for i in tqdm(range(1, n_courses + 1)):
-        tsv="course_"+str(i)+".tsv"
-        file_path= os.path.join(data_folder_path + "tsvs",tsv)
-        with open(file_path, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        
-        fields = lines[1].strip().split('\t')
-        # ensure that the list has enough elements
-        if len(fields) > 4:
-            
-            # preprocess the feature (1:description 2:course name 3:university name 4:university city) according to input choice
-            if t==1:
-                d=engine.preprocess_text(fields[4])
-            elif t==2:
-                d=engine.preprocess_text(fields[0])
-            elif t==3:
-                d=engine.preprocess_text(fields[1])
-            elif t==4:
-                d=engine.preprocess_text(fields[-4])
-                
-            # tokenize 
-            words=d.split()
-            
-            for w in words:
-                if w not in vocabulary: #add to the vocabulary if the word is not in there yet
-                    vocabulary[w]=term_id #assigns a unique id
-                    term_id+=1 # update term_id
-
-    # save the vocabulary to a file
-    vocabulary_file_path = data_folder_path + "vocabulary_type" + str(t) + ".txt"
-    with open(vocabulary_file_path, 'w', encoding='utf-8') as vocab:
-        for word, term_id in vocabulary.items():
-            vocab.write(f"{word}\t{term_id}\n")
+    vocabulary, _, _ = engine.build_indexes(engine.analyze_field(field_columns[t]))
+    engine.save_index(vocabulary, index_paths(t)[0])
 
 def generalized_load_vocabulary(file_path):
     '''
@@ -74,141 +62,63 @@ def generalized_load_vocabulary(file_path):
     
     return vocabulary
 
-def generalized_create_inverted_index(vocabulary, t):
+def generalized_create_inverted_index(vocabulary, t, documents = None):
     '''
     Works the same as the one described in 'engine.py' but generalized for all the fields needed in question 5.
+    The term ids are the ones of 'vocabulary' (the words not in it are not indexed). 'documents' can give the
+    (doc id, words) pairs of 'engine.analyze_field' already computed, otherwise the field is preprocessed again: to
+    create all the indexes of a type with a single preprocessing use 'generalized_create_indexes'.
     '''
 
     print("Creating inverted index type " + str(t) + "..." )
-    # initialize an empty inverted_index
-    inverted_index={}
-
-    for i in tqdm(range(1, n_courses + 1)):
-        tsv="course_"+str(i)+".tsv"
-        file_path= os.path.join(tsvs_path,tsv)
-        with open(file_path, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        
-        fields = lines[1].strip().split('\t')
-        # ensure that the list has enough elements
-        if len(fields) > 4:
-            # access the description field and tokenize the words,
-
-            if t==1:
-                d=engine.preprocess_text(fields[4])
-            elif t==2:
-                d=engine.preprocess_text(fields[0])
-            elif t==3:
-                d=engine.preprocess_text(fields[1])
-            elif t==4:
-                d=engine.preprocess_text(fields[-4])
-
-            words=d.split()
-            for w in words:
-                # check if the word contains alphabetical characters or numbers
-                if w in vocabulary:
-                    # update inverted index
-                    id_term = vocabulary[w]
-                    if id_term not in inverted_index:
-                        inverted_index[id_term]=[tsv]
-                    else:
-                        if(tsv not in inverted_index[id_term]):
-                            inverted_index[id_term].append(tsv)
-
-
-    # save the inverted index in a file
-    inv_index_file_path = data_folder_path + "inv_index_type" + str(t) + ".txt"
-    with open(inv_index_file_path, 'w', encoding='utf-8') as inv_ind:
-        for word, term_id in inverted_index.items():
-            inv_ind.write(f"{word}\t{term_id}\n")
-
-def generalized_create_inverted_index_tfidf(vocabulary, t):
+
+    if documents is None:
+        documents = engine.analyze_field(field_columns[t])
+    own_vocabulary, inverted_index, _ = engine.build_indexes(documents)
+    engine.save_index(_with_term_ids(inverted_index, own_vocabulary, vocabulary), index_paths(t)[1])
+
+def generalized_create_inverted_index_tfidf(vocabulary, t, documents = None):
     '''
     Works the same as the one described in 'engine.py' but generalized for all the fields needed in question 5.
+    The term ids are the ones of 'vocabulary', as in 'generalized_create_inverted_index'.
     '''
 
-    print("Creating inverted index type " + str(t) + "..." )
-    # initialize the inverted index with tf-idf scores 
-    inv_index_tfidf = {}
-    # initialize dictionaries for term frequency (t_f) and document frequency (d_f)
-    t_f = {}
-    d_f = {}
-
-    # step 1: calculate term frequency (tf) and inverse document frequency (idf)
-    for i in tqdm(range(1, n_courses + 1)):
-        tsv="course_"+str(i)+".tsv"
-        file_path= os.path.join(tsvs_path,tsv)
-        with open(file_path, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        
-        # extract the fields from the second line
-        fields = lines[1].strip().split('\t')
-        
-        # ensure that the list has enough elements
-        if len(fields) > 4:
-            # access the description field and tokenize the words,
-
-            if t==1:
-                words=engine.preprocess_text(fields[4]).split()
-            elif t==2:
-                words=engine.preprocess_text(fields[0]).split()
-            elif t==3:
-                words=engine.preprocess_text(fields[1]).split()
-            elif t==4:
-                words=engine.preprocess_text(fields[-4]).split()            
-
-            # calculate term frequency (tf) for each term in the document
-            for w in words:
-                term_id = vocabulary.get(w)
-                if term_id:
-                    # if the pair doesn't exist  it is initialized with a count of 0 before incrementing.
-                    # If the pair already exists, it doesn't override the existing value; 
-                    # it simply returns the existing value associated with that key.
-                    t_f.setdefault((term_id, tsv), 0) 
-                    t_f[(term_id, tsv)] += 1
-
-            # update document frequency for each term
-            seen_words = set()
-            for word in set(words):
-                term_id = vocabulary.get(word)
-                if term_id and term_id not in seen_words:
-                    d_f.setdefault(term_id, 0)
-                    d_f[term_id] += 1
-                    seen_words.add(term_id)
-
-    # step 2: calculate tf-idf and build the inverted index
-    for (term_id, doc_id),tf in t_f.items():
-        
-        # calculate inverse document frequency (idf)
-        idf = np.log(n_courses/ (d_f[term_id] + 1))  
-        # calculate tf-idf score
-        tfidf = np.round(tf * idf,2)
-        
-        # update the inverted index with the term_id and the corresponding tuple
-        inv_index_tfidf.setdefault(term_id, [])
-        inv_index_tfidf[term_id].append((doc_id, tfidf))
+    print("Creating inverted index tfidf type " + str(t) + "..." )
 
-    # save the inverted index in a file
-    inv_ind_tfidf_file_path = data_folder_path + "inv_index_tfidf_type" + str(t) + ".txt"
-    with open(inv_ind_tfidf_file_path, 'w', encoding='utf-8') as tfidf:
-        for word, term_id in inv_index_tfidf.items():
-            tfidf.write(f"{word}\t{term_id}\n")
+    if documents is None:
+        documents = engine.analyze_field(field_columns[t])
+    own_vocabulary, _, inv_index_tfidf = engine.build_indexes(documents)
+    engine.save_index(_with_term_ids(inv_index_tfidf, own_vocabulary, vocabulary), index_paths(t)[2])
+
+def _with_term_ids(index, own_vocabulary, vocabulary):
+    # the lists of an index built with 'own_vocabulary', under the term ids of 'vocabulary'
+    return {vocabulary[w]: index[term_id] for w, term_id in own_vocabulary.items() if w in vocabulary and term_id in index}
 
 def generalized_load_inverted_index(file_path):   
     '''
     The same as the one described in 'engine.py'
     '''
 
-    inverted_index = {}
+    return engine.load_inverted_index(file_path)
 
-    with open(file_path, 'r') as file:
-        for line in file:
-            line = line.strip().split('\t')
-            key = int(line[0])
-            value = eval(line[1])
-            inverted_index[key] = value
+# indexes of every type of search already loaded, with the modification time and size of their files
+_loaded_indexes = {}
+
+def load_indexes(t):
+    '''
+    Return vocabulary, inverted index and inverted index tfidf of a type of search, creating them if they do not exist.
+    They are read from the files only the first time, and again only when the files change.
+    '''
 
-    return inverted_index
+    if not all(os.path.exists(path) for path in index_paths(t)):
+        generalized_create_indexes(t)
+
+    signature = tuple((stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, index_paths(t)))
+    if t not in _loaded_indexes or _loaded_indexes[t][0] != signature:
+        vocabulary_path, inverted_index_path, inverted_index_tfidf_path = index_paths(t)
+        _loaded_indexes[t] = (signature, (generalized_load_vocabulary(vocabulary_path), generalized_load_inverted_index(inverted_index_path), generalized_load_inverted_index(inverted_index_tfidf_path)))
+
+    return _loaded_indexes[t][1]
 
 def get_query_dataframe(t, query):
     '''
@@ -217,23 +127,8 @@ def get_query_dataframe(t, query):
     in 'engine.py'.
     '''
 
-    # get paths
-    vocabulary_path = data_folder_path + "vocabulary_type" + str(t) + ".txt"
-    inverted_index_path = data_folder_path + "inv_index_type" + str(t) + ".txt"
-    inverted_index_tfidf_path = data_folder_path + "inv_index_tfidf_type" + str(t) + ".txt"
-
-    # create and load components
-    if not os.path.exists(vocabulary_path):
-        generalized_create_vocabulary(t)
-    vocabulary = generalized_load_vocabulary(vocabulary_path)
-
-    if not os.path.exists(inverted_index_path):
-        generalized_create_inverted_index(vocabulary, t)
-    inverted_index = generalized_load_inverted_index(inverted_index_path)
-
-    if not os.path.exists(inverted_index_tfidf_path):
-        generalized_create_inverted_index_tfidf(vocabulary, t)
-    inverted_index_tfidf = generalized_load_inverted_index(inverted_index_tfidf_path)
+    # create (all together, in a single pass) and load components
+    vocabulary, inverted_index, inverted_index_tfidf = load_indexes(t)
 
     # preprocess and tokenize the query
     query_words = engine.preprocess_text(query)
@@ -250,39 +145,23 @@ def get_query_dataframe(t, query):
     # get all useful documents #
     ############################
 
-    doc = set()
-    for i in range(len(query_words)):
-        tmp=set() 
-        w = query_words[i]
-        if w in vocabulary:
-            term_id = vocabulary[w]
-            if term_id in inverted_index:
-                t_id=inverted_index[term_id]
-                if i==0:
-                    doc.update(t_id)
-                else:
-                    tmp.update(t_id)
-        if i>0:
-            doc=doc.intersection(doc, tmp)    
+    doc = engine.intersect_postings(query_words, vocabulary, inverted_index)
 
     ##############
     # get scores #
     ##############
 
+    forward_index, doc_norms = engine.get_forward_index(inverted_index_tfidf)
     heap = []
     for doc_id in doc:
-        doc_vector = {}
-        # aggregate tf-idf scores for each term in the document
-        for term_id, tfidf in inverted_index_tfidf.items():
-            for doc, score in tfidf:
-                if doc == doc_id:
-                    doc_vector[term_id] = score
+        # tf-idf scores of the terms in the document
+        doc_vector = forward_index[doc_id]
 
         # calculate the cosine similarity
         prod = 0.0
         for i in range(len(query_vector)):
             prod += query_vector[i] * doc_vector[vocabulary[query_words[i]]] 
-        norm_doc = np.linalg.norm(np.array(list(doc_vector.values()))) 
+        norm_doc = doc_norms[doc_id]
         norm_query = np.linalg.norm(query_vector) 
         if norm_doc != 0 and norm_query != 0:
             score = prod / (norm_doc * norm_query)
@@ -294,30 +173,17 @@ def get_query_dataframe(t, query):
     # creating dataframe #
     ######################
     
+    # read only the needed columns of the matching courses from the corpus store (or from their .tsv files, see
+    # 'corpus.get_rows')
     result_documents = []
-    for i in range(len(heap)):
-        similarity_score, doc_id = heapq.heappop(heap)
-        
-        tsv_file = os.path.join(tsvs_path, f"{doc_id}")
-        with open(tsv_file, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        fields=lines[1].split("\t")
-        result_documents.append({
-                    'courseName': fields[0],
-                    'universityName': fields[1],
-                    'isItFullTime': fields[3],
-                    'description': fields[4],
-                    'startDate': fields[5],
-                    'fees (EUR)': fields[7],
-                    'city': fields[10],
-                    'country': fields[11],
-                    'administration': fields[-2],
-                    'url': fields[-1],
-                    'similarityScore_type' + str(t): -similarity_score  # Convert back to positive
-        })
-            
+    ranked = [heapq.heappop(heap) for i in range(len(heap))]
+    columns = ['courseName', 'universityName', 'isItFullTime', 'description', 'startDate', 'fees (EUR)', 'city', 'country', 'administration', 'url']
+    rows = corpus.get_rows([doc_id for _, doc_id in ranked], columns)
+    for (similarity_score, _), row in zip(ranked, rows):
+        result_documents.append({**row, 'similarityScore_type' + str(t): -similarity_score})  # Convert back to positive
+
     # return pandas DataFrame
-    return pd.DataFrame(result_documents)
+    return pd.DataFrame(result_documents, columns = columns + ['similarityScore_type' + str(t)])
 
 def calculate_start_date_difference(start_date):
     try:
@@ -351,8 +217,31 @@ def bonus_search_engine(input_dict):
     The 1st part of the bonus question completed in here
     For the 2nd, 3rd, 4th and 5th parts of the bonus question we need to make filtering. 
     The filtering process will be conducted in the search_engine_bonus function
+    The results are cached (see 'cache.py'), for the analyzed queries and the filters in use.
     '''
 
+    advanced_search_engine = input_dict["advanced_search_engine"]
+    queries = ["description_query"]
+    if advanced_search_engine:
+        queries += ["course_name_query", "university_name_query", "university_city_query"]
+
+    key = ["bonus_search_engine", advanced_search_engine] + [tuple(engine.analyzer.analyze(input_dict[query])) for query in queries]
+    if input_dict["use_fee_filter"]:
+        key.append(("fee", input_dict["min_fee"], input_dict["max_fee"]))
+    if input_dict["use_country_filter"]:
+        key.append(("country", tuple(input_dict["country_list"])))
+    if input_dict["use_start_filter"]:
+        # the filter depends on the current month
+        key.append(("start", pd.to_datetime('today').month))
+    if input_dict["use_online_filter"]:
+        key.append(("online",))
+
+    df = cache.cached(tuple(key), lambda: _bonus_search_engine(input_dict))
+    if df is None:
+        print("No courses found!")
+    return df
+
+def _bonus_search_engine(input_dict):
     description_query = input_dict["description_query"]
     df1 = get_query_dataframe(1, description_query)
 
@@ -363,22 +252,19 @@ def bonus_search_engine(input_dict):
         course_name_query = input_dict["course_name_query"]
         df2 = get_query_dataframe(2, course_name_query)
         if df2.empty:
-            print("No courses found!")
-            return
+            return None
         df1 = pd.merge(df1, df2, on=['courseName', 'universityName', 'isItFullTime', 'description', 'startDate', 'fees (EUR)', 'city', 'country', 'administration', 'url'], how='inner')
 
         university_name_query = input_dict["university_name_query"]
         df3 = get_query_dataframe(3, university_name_query)
         if df3.empty:
-            print("No courses found!")
-            return
+            return None
         df1 = pd.merge(df1, df3, on=['courseName', 'universityName', 'isItFullTime', 'description', 'startDate', 'fees (EUR)', 'city', 'country', 'administration', 'url'], how='inner')
 
         university_city_query = input_dict["university_city_query"]
         df4 = get_query_dataframe(4, university_city_query)
         if df4.empty:
-            print("No courses found!")
-            return
+            return None
         df1 = pd.merge(df1, df4, on=['courseName', 'universityName', 'isItFullTime', 'description', 'startDate', 'fees (EUR)', 'city', 'country', 'administration', 'url'], how='inner')
 
     # then we apply the filters
@@ -0,0 +1,128 @@
+'''
+This module contains the cache of the query results. The popular queries are repeated many times, so the dataframes
+computed by 'engine.search_engine', 'engine.top_k_documents', 'new_scoring.scoring_function' and
+'bonus.bonus_search_engine' are kept and given back to the same query, recognized by its analyzed words (so that
+queries differing only in case, punctuation, stopwords or inflections share the result) and by the other parameters.
+The cache keeps at most 'result_cache_size' results, for at most 'result_cache_ttl' seconds, and it is emptied as soon
+as one of the files the results come from (indexes, corpus store, extraction manifest) is written again.
+'''
+
+# import config
+from functions.config import *
+
+# import libraries
+import os
+import time
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    '''
+    Least recently used cache with expiration of its entries and hit/miss counters. The files registered with 'watch' are
+    checked at every lookup: when one of them changes (or appears, or disappears) the whole cache is cleared.
+    '''
+
+    def __init__(self, max_size = result_cache_size, ttl = result_cache_ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.watched = []
+        self.signature = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def watch(self, file_paths):
+        '''
+        Register files whose change invalidates the cache.
+        '''
+
+        with self.lock:
+            self.watched += [file_path for file_path in file_paths if file_path not in self.watched]
+
+    def _signature(self):
+        # modification time and size of the watched files
+        signature = []
+        for file_path in self.watched:
+            try:
+                stat = os.stat(file_path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def get(self, key, default = None, valid = None):
+        '''
+        Return the value stored for 'key', or 'default' (counted as a miss) if it is missing, expired or the watched files
+        have changed, or if 'valid' is given and returns False for the value.
+        '''
+
+        with self.lock:
+            signature = self._signature()
+            if signature != self.signature:
+                self.entries.clear()
+                self.signature = signature
+
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl or (valid is not None and not valid(entry[1])):
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        '''
+        Store 'value' for 'key', removing the least recently used entry if the cache is full.
+        '''
+
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last = False)
+
+    def clear(self):
+        '''
+        Remove all the entries (the counters are kept).
+        '''
+
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        '''
+        Return hits, misses and number of entries of the cache.
+        '''
+
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+# cache shared by all the search functions of the project
+result_cache = ResultCache()
+
+def cached(key, compute, indexes = ()):
+    '''
+    Return the result of 'compute()' for 'key', computing it only if it is not in the cache. 'indexes' are the objects
+    (vocabulary, inverted indexes) the result is computed from: the result is given back only for the same objects.
+    The results are dataframes that the callers may change, so the cache keeps its own copy and gives back a new copy
+    every time.
+    '''
+
+    key = key + tuple(id(index) for index in indexes)
+    # the objects are kept with the result, so that their ids cannot be reused by other objects
+    entry = result_cache.get(key, _missing, lambda entry: all(a is b for a, b in zip(entry[0], indexes)))
+    if entry is not _missing:
+        return _copy(entry[1])
+
+    result = compute()
+    result_cache.put(key, (tuple(indexes), _copy(result)))
+    return result
+
+_missing = object()
+
+def _copy(result):
+    return result.copy() if hasattr(result, "copy") else result
@@ -10,6 +10,17 @@ global data_folder_path
 data_folder_path = r"data/"
 
 
+# base urls of the external services used troughout the notebook (website to crawl, currency conversion and geocoding),
+# they can be redirected to a local replay server (see functions/replay.py)
+global service_urls
+service_urls = {"findamasters": r"https://www.findamasters.com",
+                "exchange_rates": r"https://open.er-api.com",
+                "geocoding": r"https://dev.virtualearth.net"}
+
+# path of the folder containing the recorded answers of the external services
+global cassettes_path
+cassettes_path = r"data/cassettes/"
+
 # file path of the .txt file to create
 global courses_urls_path
 courses_urls_path = data_folder_path + r"courses_urls.txt"
@@ -26,14 +37,44 @@ courses_per_page = 15
 global n_courses
 n_courses = n_pages * courses_per_page
 
+# maximum number of simultaneous connections opened by the asynchronous crawler
+global n_connections
+n_connections = 8
+
+# maximum number of requests per second sent to a single host by the asynchronous crawler
+global requests_per_second
+requests_per_second = 4
+
 # path of the folder containing all the subfolders with the html files
 global courses_pages_path
 courses_pages_path = r"data/courses_html_pages/"
 
+# paths of the compressed archive of the html pages and of its index
+global courses_archive_path
+courses_archive_path = r"data/courses_pages.warc.gz"
+global courses_archive_index_path
+courses_archive_index_path = r"data/courses_pages.warc.idx"
+
+# if True crawler, checker and parser read and write the html pages through the archive instead of the loose files
+global use_page_archive
+use_page_archive = False
+
+# path of the manifest storing ETag, Last-Modified and content hash of every crawled page
+global crawl_manifest_path
+crawl_manifest_path = r"data/crawl_manifest.json"
+
 # path of the folder containing all the .tsv files
 global tsvs_path
 tsvs_path = r"data/tsvs/"
 
+# path of the manifest storing, for every extracted course, the hash of its .html page and the version of the extractor
+global extraction_manifest_path
+extraction_manifest_path = r"data/extraction_manifest.json"
+
+# path of the columnar file (Arrow/Feather) collecting all the .tsv files
+global corpus_store_path
+corpus_store_path = r"data/corpus.arrow"
+
 # path of the vocabulary file
 global vocabulary_file_path
 vocabulary_file_path = r"data/vocabulary.txt"
@@ -46,6 +87,34 @@ inv_index_file_path = r"data/inverted_index.txt"
 global inv_ind_tfidf_file_path
 inv_ind_tfidf_file_path = r"data/inv_index_tfidf.txt"
 
+# path of the folder containing the binary version of vocabulary, inverted index and inverted index tfidf
+global binary_index_path
+binary_index_path = r"data/binary_index/"
+
+# path of the folder containing the shards of the indexes (see functions/sharding.py) and number of shards
+global shards_path
+shards_path = r"data/shards/"
+global n_shards
+n_shards = 4
+
+# path of the positional index (optional, see 'positional.py')
+global positional_index_path
+positional_index_path = r"data/positional_index.bin"
+
 # path of the coordinates table
 global coordinates_table_path
-coordinates_table_path = r"data/coordinates_table.csv"
\ No newline at end of file
+coordinates_table_path = r"data/coordinates_table.csv"
+
+# maximum number of query results kept in the cache and seconds after which a cached result expires
+global result_cache_size
+result_cache_size = 256
+global result_cache_ttl
+result_cache_ttl = 3600
+
+# address of the local search service (see functions/service.py) and number of its worker processes
+global service_host
+service_host = "127.0.0.1"
+global service_port
+service_port = 8080
+global service_workers
+service_workers = 4
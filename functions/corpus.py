@@ -0,0 +1,201 @@
+# import config
+from functions.config import *
+
+# import libraries
+import os
+import csv
+import zlib
+import importlib.util
+import numpy as np
+from tqdm.notebook import tqdm
+# pyarrow is needed only by the corpus store, it is imported by the functions using it: without it the .tsv files are read
+
+# columns of the .tsv files, 'fees (EUR)' is added in the eighth position by 'engine.fees_preprocessing'
+tsv_columns = ["courseName", "universityName", "facultyName", "isItFullTime", "description", "startDate", "fees", "modality", "duration", "city", "country", "administration", "url"]
+
+# columns stored compressed (zlib, one block per course) in the corpus store, they are decompressed only when requested
+# (always read the store with 'read_table' or 'get_rows': a plain feather reader would give the compressed bytes)
+compressed_columns = ["description"]
+
+def corpus_available():
+    '''
+    True if the corpus store has already been created and pyarrow, needed to read it, is installed.
+    '''
+
+    return os.path.exists(corpus_store_path) and importlib.util.find_spec("pyarrow") is not None
+
+def build_corpus_store(rows = None):
+    '''
+    Collect all the .tsv files in a single columnar file (Arrow IPC format, also known as Feather). Every row is a course,
+    identified by the integer column 'course_id' (the N of 'course_N.tsv'), and all the other columns are stored as strings
+    exactly as they are written in the .tsv files. The file is not compressed, so it can be memory-mapped and a reader
+    only touches the columns it asks for; the long texts of 'compressed_columns' are instead compressed course by course,
+    so that reading some courses decompresses only their values, and only if the column is requested.
+    'rows' can give the content of the .tsv files (one dictionary for every course, in order) when it is already in memory.
+    '''
+
+    import pyarrow as pa
+
+    print("Creating corpus store...")
+
+    if rows is None:
+        rows = [read_tsv(i) for i in tqdm(range(1, n_courses + 1))]
+
+    columns = list(tsv_columns)
+    if any("fees (EUR)" in row for row in rows):
+        columns.insert(7, "fees (EUR)")
+
+    data = {"course_id": pa.array(range(1, n_courses + 1), type = pa.int32())}
+    for column in columns:
+        data[column] = pa.array([row.get(column, "") for row in rows], type = pa.string())
+
+    _write_table(pa.table(data))
+
+def update_courses(course_ids):
+    '''
+    Replace in the corpus store the rows of the given courses, reading again only their .tsv files.
+    '''
+
+    import pyarrow as pa
+
+    table = read_table()
+    data = {column: table.column(column).to_pylist() for column in table.column_names}
+
+    for course_id in course_ids:
+        row = read_tsv(course_id)
+        for column in table.column_names[1:]:
+            data[column][course_id - 1] = row.get(column, "")
+
+    _write_table(pa.table(data, schema = table.schema))
+
+def read_tsv(course_id):
+    '''
+    Return the content of the .tsv file of a course as a dictionary from the columns to the values.
+    '''
+
+    file_path = os.path.join(tsvs_path, "course_" + str(course_id) + ".tsv")
+    with open(file_path, 'r', encoding = 'utf-8', newline = '') as tsv_file:
+        header, values = list(csv.reader(tsv_file, delimiter = '\t'))[:2]
+
+    return dict(zip(header, values))
+
+def _write_table(table):
+    # compress the columns of 'compressed_columns' still given as strings
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    for column in compressed_columns:
+        if column in table.column_names and pa.types.is_string(table.schema.field(column).type):
+            values = [zlib.compress(value.encode('utf-8')) if value is not None else None for value in table.column(column).to_pylist()]
+            table = table.set_column(table.column_names.index(column), column, pa.array(values, type = pa.binary()))
+
+    # write under a temporary name and then rename, readers never see a partial file
+    tmp_path = corpus_store_path + ".tmp"
+    feather.write_feather(table, tmp_path, compression = "uncompressed")
+    os.replace(tmp_path, corpus_store_path)
+
+def read_table(columns = None):
+    '''
+    Open the corpus store as a memory-mapped Arrow table, reading only the requested columns. The compressed columns are
+    given back decompressed, as strings.
+    '''
+
+    import pyarrow.feather as feather
+
+    return _decompress(feather.read_table(corpus_store_path, columns = columns, memory_map = True))
+
+def _decompress(table):
+    # replace the compressed columns of the table with their strings (a store written before the compression of the
+    # columns has them as strings already)
+    import pyarrow as pa
+
+    for column in compressed_columns:
+        if column in table.column_names and pa.types.is_binary(table.schema.field(column).type):
+            values = [zlib.decompress(value).decode('utf-8') if value is not None else None for value in table.column(column).to_pylist()]
+            table = table.set_column(table.column_names.index(column), column, pa.array(values, type = pa.string()))
+    return table
+
+def store_columns():
+    '''
+    Return the names of the columns of the corpus store, reading only its schema.
+    '''
+
+    import pyarrow as pa
+
+    with pa.memory_map(corpus_store_path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+def load_corpus(columns = None):
+    '''
+    Return the corpus (or only the requested columns) as a pandas DataFrame of strings, one row per course.
+    '''
+
+    return read_table(columns).to_pandas()
+
+def read_field(column):
+    '''
+    Return the list of the values of a column for all the courses, the value of course N is in position N - 1.
+    When the corpus store does not exist yet the values are read from the .tsv files with 'read_tsv', as they were read
+    to build the store.
+    '''
+
+    if corpus_available():
+        return read_table([column]).column(column).to_pylist()
+
+    return [read_tsv(i).get(column, "") for i in range(1, n_courses + 1)]
+
+def get_rows(course_ids, columns):
+    '''
+    Return the requested columns of the given courses as a list of dictionaries, in the same order of 'course_ids'.
+    Columns not yet in the store (as 'fees (EUR)' before 'engine.fees_preprocessing') are given as empty strings.
+    Only the requested columns are read, and the compressed ones are decompressed only for the given courses.
+    When the corpus store does not exist yet the rows are read from the .tsv files with 'read_tsv'.
+    '''
+
+    if not corpus_available():
+        rows = [read_tsv(course_id) for course_id in course_ids]
+        return [{column: row.get(column, "") for column in columns} for row in rows]
+
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    available = set(store_columns())
+    table = feather.read_table(corpus_store_path, columns = [column for column in columns if column in available], memory_map = True)
+    indices = pa.array([course_id - 1 for course_id in course_ids], type = pa.int64())
+
+    rows = _decompress(table.take(indices)).to_pylist()
+    return [{column: row.get(column, "") for column in columns} for row in rows]
+
+def set_column(column, values, position = None):
+    '''
+    Add (or replace) a column of the corpus store. 'values' are converted to strings as pandas writes them in the .tsv files,
+    so a missing value (NaN or None) becomes an empty string.
+    '''
+
+    import pyarrow as pa
+
+    values = pa.array(["" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value) for value in values], type = pa.string())
+
+    table = read_table()
+    if column in table.column_names:
+        table = table.set_column(table.column_names.index(column), column, values)
+    else:
+        table = table.add_column(len(table.column_names) if position is None else position, column, values)
+
+    _write_table(table)
+
+def export_tsv(file_path):
+    '''
+    Write the whole corpus in a single .tsv file with the same header of the .tsv files of the courses, one row per course.
+    '''
+
+    table = read_table()
+    df = table.drop_columns(["course_id"]).to_pandas()
+    df.to_csv(file_path, sep = '\t', index = False)
+
+def course_id_from_tsv(tsv):
+    '''
+    Return the integer id of a course from the name of its .tsv file ('course_N.tsv' -> N).
+    '''
+
+    return int(tsv[len("course_"):-len(".tsv")])
@@ -1,5 +1,7 @@
 # import config
 from functions.config import *
+from functions.archive import PageArchive, open_archive
+from functions.replay import live_service_urls, resolve
 
 # import libraries
 import os
@@ -7,15 +9,33 @@ import requests
 from bs4 import BeautifulSoup
 from tqdm.notebook import tqdm
 import time
-
-def get_courses_links():
+import asyncio
+import concurrent.futures
+from urllib.parse import urlsplit
+import hashlib
+import json
+import re
+from html import unescape
+
+# user agent taken from a real chrome session, used by the asynchronous crawler
+crawler_headers = {"user-agent": r"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"}
+
+# the fast check of the pages looks for the title only in their first bytes
+title_pattern = re.compile(r"<title(?:\s[^>]*)?>(.*?)</title\s*>", re.IGNORECASE | re.DOTALL)
+title_sniff_size = 16 * 1024
+
+def get_courses_links(use_async = False, base_url = None):
     '''
     This function go get from the target website of this homework the link to the individual courses.
     To avoid useless web crawls we do not open the webpage if the file already exist.
     The number of courses depends on the number of pages we want to crawl and the number of coruses per page, both of which are defined as global parameters in functions/config.py.
     The crawled links are then inserted in a txt file which path is also defined as a global variable.
+    With 'use_async' the pages are downloaded concurrently by the asynchronous crawler, 'base_url' can point to a local server for testing.
     '''
 
+    if base_url is None:
+        base_url = live_service_urls["findamasters"]
+
     # create main data folder if doesn't already exist
     if not os.path.exists(data_folder_path): 
         os.makedirs(data_folder_path)
@@ -41,14 +61,21 @@ def get_courses_links():
 
 
     # if data is missing go crawl
-    if to_crawl == True:
+    if to_crawl == True and use_async == True:
+        links = _run_async(async_get_courses_links(base_url))
+
+        with open(courses_urls_path, 'w') as file:
+            for link in links:
+                file.write(link + "\n")
+
+    elif to_crawl == True:
 
         with open(courses_urls_path, 'w') as file: # open file, if already exist creates a new one
             for i in tqdm(range(n_pages)): # cycle trough every page
-                url = r"https://www.findamasters.com/masters-degrees/msc-degrees/?PG=" + str(1 + i) # we compose the url
+                url = base_url + r"/masters-degrees/msc-degrees/?PG=" + str(1 + i) # we compose the url
 
                 # get the webpage
-                webpage = requests.get(url, headers = headers)
+                webpage = requests.get(resolve(url), headers = headers)
                 soup = BeautifulSoup(webpage.text)
                 soup.prettify()
 
@@ -59,17 +86,19 @@ def get_courses_links():
 
                 for tag in tags: # for every tag get the course link and append to file
                     link = tag["href"]
-                    file.write(r"https://www.findamasters.com" + link + "\n")
+                    file.write(base_url + link + "\n")
 
                 time.sleep(sleep_time) # wait to avoid getting blocked
 
         # the file automatically close itself when the "with" section ends, saving the written lines
 
-def crawl_pages():
+def crawl_pages(use_async = False, use_archive = use_page_archive):
     '''
     This function open the single courses pages and download relative .html file for later use.
     To avoid useless web crawls we do not open a webpage if the relative file already exist.
     The function try to crawl all the links listed in the .txt file generated by the previous function
+    With 'use_async' the pages are downloaded concurrently by the asynchronous crawler.
+    With 'use_archive' the pages are appended to the compressed page archive instead of being saved as separate files.
     '''
 
     sleep_time = 2 # idle time between to requests, to avoid being blocked
@@ -77,13 +106,17 @@ def crawl_pages():
     headers = {"user-agent": r"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"}
 
     # create folder if not exist already
-    if not os.path.exists(courses_pages_path):
+    if not os.path.exists(courses_pages_path) and use_archive == False:
         os.makedirs(courses_pages_path)
 
     # we check if the files already exists, in this case we do not repeat the crawling
     files_count = 0
-    for _, _, files in os.walk(courses_pages_path):
-        files_count += len(files)
+    if use_archive == True:
+        with open_archive(use_archive) as page_archive:
+            files_count = len(page_archive)
+    else:
+        for _, _, files in os.walk(courses_pages_path):
+            files_count += len(files)
 
     if files_count < n_courses:
         print("Crawling...")
@@ -92,43 +125,187 @@ def crawl_pages():
         print("All files already crawled. Using the existing version.")
 
     # if data is missing go crawl
-    if to_crawl == True:
+    if to_crawl == True and use_async == True:
+        _run_async(async_crawl_pages(use_archive = use_archive))
+
+    elif to_crawl == True:
 
         # make a folder for every page if not already created
         for i in range(1, n_pages + 1):
             folder_path = courses_pages_path + "page_" + str(i)
-            if not os.path.exists(folder_path):
+            if not os.path.exists(folder_path) and use_archive == False:
                 os.makedirs(folder_path)
 
+        # the manifest stores the validators of every downloaded page, used later by 'refresh_pages'
+        manifest = load_crawl_manifest()
+
         # populate folders
-        with open(courses_urls_path, 'r') as file_1:
-            for i, course_url in tqdm(enumerate(file_1), total = n_courses):
+        try:
+            with open(courses_urls_path, 'r') as file_1, open_archive(use_archive) as page_archive:
+                for i, course_url in tqdm(enumerate(file_1), total = n_courses):
+                    course_url = course_url.strip('\n')
+
+                    if not _page_exists(1 + i, page_archive): # if already crawled do not repeat
+                        # get page
+                        webpage = requests.get(resolve(course_url), headers = headers)
+                        soup = BeautifulSoup(webpage.text, "html.parser")
+
+                        if soup.title.text == r"Just a moment...":
+                            raise IOError("Crawler has been blocked by the website. Try again with higher idle time.")
+
+                        # write file
+                        _store_page(manifest, course_url, 1 + i, webpage.headers, str(soup), page_archive)
+
+                        time.sleep(sleep_time) # wait to avoid getting blocked
+        finally:
+            save_crawl_manifest(manifest)
+
+def refresh_pages(use_async = False, use_archive = use_page_archive):
+    '''
+    This function update the already downloaded courses pages. For every course we send a conditional request built
+    from the validators stored in the crawl manifest (ETag and Last-Modified of the previous download), so the website
+    can answer "304 Not Modified" without sending the page again. When the page is sent anyway we compare the hash of its
+    content with the stored one and we rewrite the file only if it has really changed.
+    Returns the sorted list of the numbers of the courses whose page changed.
+    '''
+
+    sleep_time = 2 # idle time between to requests, to avoid being blocked
+    headers = {"user-agent": r"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"}
+
+    manifest = load_crawl_manifest()
+    changed_courses = []
+
+    with open_archive(use_archive) as page_archive:
+
+        # a conditional request makes sense only if we still have the previous version of the page
+        jobs = []
+        with open(courses_urls_path, 'r') as file:
+            for i, course_url in enumerate(file):
                 course_url = course_url.strip('\n')
-                course_file_path = courses_pages_path + "page_" + str(1 + i // courses_per_page) + "/" + "course_" + str(1 + i % courses_per_page) + ".html"
+                if _page_exists(1 + i, page_archive):
+                    validators = _conditional_headers(_manifest_entry(manifest, 1 + i, course_url))
+                else:
+                    validators = {}
+                jobs.append((1 + i, course_url, validators))
 
-                if not os.path.exists(course_file_path): # if already crawled do not repeat
-                    # get page
-                    webpage = requests.get(course_url, headers = headers)
-                    soup = BeautifulSoup(webpage.text, "html.parser")
+        try:
+            if use_async == True:
+                _run_async(_async_refresh_pages(jobs, manifest, changed_courses, page_archive))
+
+            else:
+                for course, course_url, validators in tqdm(jobs):
+                    webpage = requests.get(resolve(course_url), headers = {**headers, **validators})
 
-                    if soup.title.text == r"Just a moment...":
-                        raise IOError("Crawler has been blocked by the website. Try again with higher idle time.")
+                    if webpage.status_code != 304: # page sent again, check if it changed
+                        soup = BeautifulSoup(webpage.text, "html.parser")
 
-                    # write file
-                    with open(course_file_path, 'w+', encoding = "utf-8") as file_2:
-                        # html_page = soup.prettify()
-                        # file_2.write(str(html_page))
-                        file_2.write(str(soup))
-                    # the file automatically close itself when the "with" section ends, saving the written lines
+                        if soup.title.text == r"Just a moment...":
+                            raise IOError("Crawler has been blocked by the website. Try again with higher idle time.")
+
+                        if _store_page(manifest, course_url, course, webpage.headers, str(soup), page_archive):
+                            changed_courses.append(course)
 
                     time.sleep(sleep_time) # wait to avoid getting blocked
+        finally:
+            save_crawl_manifest(manifest)
+
+    print(len(changed_courses), "pages have changed since the last crawl.")
+    return sorted(changed_courses)
+
+def get_course_file_path(i):
+    '''
+    Return the path of the .html file of the i-th course (counting from zero) listed in the .txt file.
+    '''
+
+    return courses_pages_path + "page_" + str(1 + i // courses_per_page) + "/" + "course_" + str(1 + i % courses_per_page) + ".html"
+
+def load_crawl_manifest():
+    '''
+    Load the crawl manifest, a dictionary that for every course number (as a string, as in the extraction manifest)
+    stores the url, the ETag, the Last-Modified date and the hash of the page we downloaded. Returns an empty dictionary
+    if nothing has been crawled yet.
+    '''
+
+    if not os.path.exists(crawl_manifest_path):
+        return {}
+
+    with open(crawl_manifest_path, 'r', encoding = "utf-8") as file:
+        manifest = json.load(file)
+
+    # manifests written by older versions were keyed by url: every entry goes to the courses with that url
+    if any(not key.isdigit() for key in manifest) and os.path.exists(courses_urls_path):
+        with open(courses_urls_path, 'r') as courses_file:
+            urls = [url.strip('\n') for url in courses_file]
+        manifest = {str(1 + i): {"url": url, **manifest[url]} for i, url in enumerate(urls) if url in manifest}
+
+    return manifest
 
-def check_html_files():
+def save_crawl_manifest(manifest):
+    '''
+    Save the crawl manifest. The file is first written under a temporary name and then renamed, so an interrupted crawl
+    never leaves a truncated manifest.
+    '''
+
+    os.makedirs(os.path.dirname(crawl_manifest_path), exist_ok = True)
+
+    tmp_path = crawl_manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding = "utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, crawl_manifest_path)
+
+def _conditional_headers(entry):
+    validators = {}
+    if entry.get("etag"):
+        validators["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        validators["If-Modified-Since"] = entry["last_modified"]
+    return validators
+
+def _manifest_entry(manifest, course, course_url):
+    # the entry of a course, only if it refers to the same url (the list of courses may have changed)
+    entry = manifest.get(str(course), {})
+    return entry if entry.get("url") == course_url else {}
+
+def _page_exists(course, page_archive = None):
+    if page_archive is not None:
+        return course in page_archive
+    return os.path.exists(get_course_file_path(course - 1))
+
+def _store_page(manifest, course_url, course, response_headers, html, page_archive = None):
+    '''
+    Write a downloaded page if its content differs from the one recorded in the manifest (or if the page is missing)
+    and update the manifest entry of the course. The page is appended to 'page_archive' if given, otherwise it is saved
+    in its .html file. Returns True if the page has been written.
+    '''
+
+    content_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+    changed = _manifest_entry(manifest, course, course_url).get("hash") != content_hash or not _page_exists(course, page_archive)
+
+    if changed and page_archive is not None:
+        page_archive.append(course, course_url, html)
+
+    elif changed:
+        course_file_path = get_course_file_path(course - 1)
+        os.makedirs(os.path.dirname(course_file_path), exist_ok = True)
+        with open(course_file_path, 'w+', encoding = "utf-8") as file:
+            file.write(html)
+
+    manifest[str(course)] = {"url": course_url,
+                             "etag": response_headers.get("ETag"),
+                             "last_modified": response_headers.get("Last-Modified"),
+                             "hash": content_hash}
+
+    return changed
+
+def check_html_files(use_archive = use_page_archive, fast = False, n_workers = None):
     '''
     This function check if we downloaded correctly all the html files.
     It divides the files in three groups: those which are downloaded incorrectly because the crawler was blocked,
     those which are downloaded incorrectly because not missing on the website,
     those which are downloaded correctly.
+    With 'use_archive' the pages are read from the compressed page archive, blocked pages are removed from it.
+    With 'fast' the title is looked for in the first few KB of every page instead of parsing the whole page, and the pages
+    are divided among 'n_workers' processes (by default one for every core).
     '''
 
     print("Checking the correctness of the crawl operation...")
@@ -136,19 +313,19 @@ def check_html_files():
     blocked_pages = 0
     unaviable_pages = 0
     correct_pages = 0
-    for root, _, files in tqdm(os.walk(courses_pages_path), total = n_pages + 1): # checks for files in 400 subfolders and on root folder, thus 401
-        for file in files:
-            course_file_path = os.path.join(root, file)
-
-            with open(course_file_path, 'r', encoding = "utf-8") as html_file:
-                html_content = html_file.read()
-
-            soup = BeautifulSoup(html_content, "html.parser")
-            page_title = soup.title.text
+    with open_archive(use_archive) as page_archive:
+        if fast == True:
+            titles = _sniff_titles(page_archive, n_workers)
+        else:
+            titles = ((page, BeautifulSoup(html_content, "html.parser").title.text) for page, html_content in _iterate_pages(page_archive))
 
+        for page, page_title in titles:
             if page_title == r"Just a moment...": # blocked during crawling
                 blocked_pages += 1
-                os.remove(course_file_path)
+                if page_archive is not None:
+                    page_archive.remove(page)
+                else:
+                    os.remove(page)
             elif page_title == r"FindAMasters | 500 Error : Internal Server Error": # missing on website
                 unaviable_pages += 1
             else: # downloaded correctly
@@ -156,4 +333,260 @@ def check_html_files():
 
     print(blocked_pages, "pages were blocked during crawling and had been removed. If this value is not zero run the crawling again to get the missing pages.")
     print(unaviable_pages, "pages are not available on the website.")
-    print(correct_pages, "pages have been correctly downloaded.")
\ No newline at end of file
+    print(correct_pages, "pages have been correctly downloaded.")
+
+def sniff_title(html_start):
+    '''
+    Return the text of the title of a page looking for the <title> tag with a regular expression, without building the tree
+    of the page. Returns None if the title is not found (for example because 'html_start' is only the beginning of the page)
+    or if it contains other tags, in those cases the page has to be parsed completely.
+    '''
+
+    match = title_pattern.search(html_start)
+    if match is None or "<" in match.group(1):
+        return None
+
+    return unescape(match.group(1))
+
+def _sniff_file_titles(paths):
+    titles = []
+    for path in paths:
+        with open(path, 'r', encoding = "utf-8") as html_file:
+            page_title = sniff_title(html_file.read(title_sniff_size))
+            if page_title is None:
+                html_file.seek(0)
+                page_title = BeautifulSoup(html_file.read(), "html.parser").title.text
+        titles.append((path, page_title))
+
+    return titles
+
+def _sniff_archive_titles(courses):
+    titles = []
+    with PageArchive(read_only = True) as page_archive:
+        for course in courses:
+            page_title = sniff_title(page_archive.read_head(course, title_sniff_size))
+            if page_title is None:
+                page_title = BeautifulSoup(page_archive.read(course), "html.parser").title.text
+            titles.append((course, page_title))
+
+    return titles
+
+def _sniff_titles(page_archive, n_workers, chunk_size = 100):
+    '''
+    Yield the (page, title) pairs of all the downloaded pages, sniffing the titles in a pool of processes.
+    Every process receives chunks of 'chunk_size' pages, in the archive it opens its own read-only copy.
+    '''
+
+    if page_archive is not None:
+        pages = page_archive.courses()
+        worker = _sniff_archive_titles
+    else:
+        pages = [os.path.join(root, file) for root, _, files in os.walk(courses_pages_path) for file in files]
+        worker = _sniff_file_titles
+
+    chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(n_workers) as executor:
+        for titles in tqdm(executor.map(worker, chunks), total = len(chunks)):
+            yield from titles
+
+def _iterate_pages(page_archive = None):
+    '''
+    Yield all the downloaded pages as (page, html) pairs, where page is the course number for pages in the archive
+    and the file path for the loose .html files.
+    '''
+
+    if page_archive is not None:
+        yield from tqdm(page_archive.items(), total = len(page_archive))
+        return
+
+    for root, _, files in tqdm(os.walk(courses_pages_path), total = n_pages + 1): # checks for files in 400 subfolders and on root folder, thus 401
+        for file in files:
+            course_file_path = os.path.join(root, file)
+
+            with open(course_file_path, 'r', encoding = "utf-8") as html_file:
+                yield course_file_path, html_file.read()
+
+########################
+# asynchronous crawler #
+########################
+
+class TokenBucket:
+    '''
+    Token bucket used by the asynchronous crawler to limit the rate of the requests sent to a single host.
+    The bucket is refilled with 'rate' tokens per second up to 'capacity' tokens and every request consumes one token.
+    When the website answers with its block page the rate is halved (never below 'min_rate'), after every successful
+    request it slowly grows back to its initial value.
+    '''
+
+    def __init__(self, rate, capacity = 1, min_rate = 0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # requests to the same host wait in line for their token
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def slow_down(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+def _run_async(coroutine):
+    '''
+    Run a coroutine until it completes. Inside a notebook an event loop is already running, in that case the coroutine
+    is executed in a separate thread with its own event loop.
+    '''
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+def _is_block_page(soup):
+    return soup.title is not None and soup.title.text == r"Just a moment..."
+
+async def _async_fetch(session, url, request_headers, bucket, is_blocked, max_retries, backoff_time):
+    '''
+    Download a single page respecting the rate limit of its host and return the response together with the parsed page.
+    If the page is recognized as blocked (or the server answers with a temporary error) we slow down the host and wait an
+    exponentially increasing idle time before trying again.
+    A "304 Not Modified" answer to a conditional request has no page, in that case None is returned in its place.
+    '''
+
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+
+        async with session.get(resolve(url), headers = request_headers) as response:
+            text = await response.text()
+
+        if response.status in (429, 503): # temporary error, the server asks us to slow down
+            bucket.slow_down()
+            await asyncio.sleep(backoff_time * 2 ** attempt)
+            continue
+
+        if response.status == 304:
+            bucket.speed_up()
+            return response, None
+
+        soup = BeautifulSoup(text, "html.parser")
+        if not is_blocked(soup):
+            bucket.speed_up()
+            return response, soup
+
+        bucket.slow_down()
+        await asyncio.sleep(backoff_time * 2 ** attempt)
+
+    raise IOError("Crawler has been blocked by the website. Try again with higher idle time.")
+
+async def _async_crawl(jobs, is_blocked, on_page, connections, rate, max_retries, backoff_time):
+    '''
+    Download all the (key, url, request headers) triples in 'jobs' using at most 'connections' simultaneous connections
+    and a token bucket for every host. Every response is passed, together with its key and the parsed page, to 'on_page'.
+    '''
+
+    # aiohttp is needed only by the asynchronous crawler, the sequential one works without it
+    import aiohttp
+
+    buckets = {}
+    progress = tqdm(total = len(jobs))
+    jobs = iter(jobs)
+
+    connector = aiohttp.TCPConnector(limit = connections)
+    async with aiohttp.ClientSession(headers = crawler_headers, connector = connector) as session:
+
+        async def worker():
+            for key, url, request_headers in jobs: # the iterator is shared, so every job is taken by a single worker
+                host = urlsplit(url).netloc
+                if host not in buckets:
+                    buckets[host] = TokenBucket(rate, capacity = max(1, rate))
+
+                response, soup = await _async_fetch(session, url, request_headers, buckets[host], is_blocked, max_retries, backoff_time)
+                on_page(key, response, soup)
+                progress.update(1)
+
+        workers = [asyncio.create_task(worker()) for _ in range(connections)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    progress.close()
+
+async def async_get_courses_links(base_url = None, connections = n_connections, rate = requests_per_second, max_retries = 5, backoff_time = 2):
+    '''
+    Asynchronous version of the link crawling done in 'get_courses_links'. The result pages are downloaded concurrently
+    and the list of the courses links is returned in the same order of the sequential crawler.
+    '''
+
+    if base_url is None:
+        base_url = live_service_urls["findamasters"]
+
+    links = {}
+
+    # a blocked results page is recognized by its title, as the course pages; a results page without course links
+    # (e.g. the last one) simply gives no links
+    def on_page(page, response, soup):
+        links[page] = [base_url + tag["href"] for tag in soup.find_all('a', {"class": "courseLink"})]
+
+    jobs = [(i, base_url + r"/masters-degrees/msc-degrees/?PG=" + str(1 + i), {}) for i in range(n_pages)]
+    await _async_crawl(jobs, _is_block_page, on_page, connections, rate, max_retries, backoff_time)
+
+    return [link for i in range(n_pages) for link in links[i]]
+
+async def async_crawl_pages(connections = n_connections, rate = requests_per_second, max_retries = 5, backoff_time = 2, use_archive = use_page_archive):
+    '''
+    Asynchronous version of the download done in 'crawl_pages'. The courses listed in the .txt file are downloaded concurrently
+    and saved with the same 'page_N/course_M.html' layout (or in the page archive), courses already downloaded are skipped.
+    '''
+
+    manifest = load_crawl_manifest()
+
+    with open_archive(use_archive) as page_archive:
+        jobs = []
+        with open(courses_urls_path, 'r') as file:
+            for i, course_url in enumerate(file):
+                if not _page_exists(1 + i, page_archive):
+                    jobs.append((1 + i, course_url.strip('\n'), {}))
+
+        urls = {course: course_url for course, course_url, _ in jobs}
+
+        def on_page(course, response, soup):
+            _store_page(manifest, urls[course], course, response.headers, str(soup), page_archive)
+
+        try:
+            await _async_crawl(jobs, _is_block_page, on_page, connections, rate, max_retries, backoff_time)
+        finally:
+            save_crawl_manifest(manifest)
+
+async def _async_refresh_pages(jobs, manifest, changed_courses, page_archive = None, connections = n_connections, rate = requests_per_second, max_retries = 5, backoff_time = 2):
+    '''
+    Asynchronous version of the conditional download done in 'refresh_pages'.
+    '''
+
+    urls = {course: course_url for course, course_url, _ in jobs}
+
+    def on_page(course, response, soup):
+        if soup is not None and _store_page(manifest, urls[course], course, response.headers, str(soup), page_archive):
+            changed_courses.append(course)
+
+    await _async_crawl(jobs, _is_block_page, on_page, connections, rate, max_retries, backoff_time)
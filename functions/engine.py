@@ -1,5 +1,7 @@
 # import config
 from functions.config import *
+from functions import corpus
+from functions import cache
 
 # import libraries
 import re
@@ -15,6 +17,56 @@ import os
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 import heapq
+import functools
+from array import array
+from bisect import bisect_left
+
+# the cached query results are dropped when the indexes, the corpus store or the .tsv files are created again
+cache.result_cache.watch([vocabulary_file_path, inv_index_file_path, inv_ind_tfidf_file_path, corpus_store_path, extraction_manifest_path])
+
+class Analyzer:
+    '''
+    Reusable version of the text preprocessing of 'preprocess_text': punctuation removal, tokenization, stopwords removal
+    and Porter stemming. The regular expression, the stopwords set and the stemmer are created only once, and the stems
+    are memoized in a LRU cache of 'cache_size' words, since the same words occur in thousands of descriptions.
+    The output is the same of 'preprocess_text', token by token.
+    '''
+
+    def __init__(self, cache_size = 100000):
+        # a token is a maximal sequence of word characters, as after replacing the punctuation with spaces and splitting
+        self.token_pattern = re.compile(r'\w+')
+        self.stemmer = PorterStemmer()
+        self.stem = functools.lru_cache(maxsize = cache_size)(self.stemmer.stem)
+        self._stop_words = None
+
+    @property
+    def stop_words(self):
+        # loaded at the first use, so creating an analyzer does not need the nltk data
+        if self._stop_words is None:
+            self._stop_words = frozenset(stopwords.words('english'))
+        return self._stop_words
+
+    def analyze(self, txt):
+        '''
+        Return the list of the preprocessed words of a text.
+        '''
+
+        stop_words = self.stop_words
+        stem = self.stem
+        return [word for word in (stem(t) for t in self.token_pattern.findall(txt) if t not in stop_words) if word]
+
+    def analyze_many(self, texts):
+        '''
+        Return the lists of the preprocessed words of many texts.
+        '''
+
+        return [self.analyze(txt) for txt in texts]
+
+    def cache_info(self):
+        return self.stem.cache_info()
+
+# analyzer shared by all the functions of the project
+analyzer = Analyzer()
 
 def preprocess_text(txt):
     '''
@@ -24,26 +76,10 @@ def preprocess_text(txt):
     Stopwords, common words that often don't contribute much to the meaning, are then removed from the tokenized text.
     The function employs stemming using the Porter Stemmer to reduce words to their root form, helping to consolidate similar words.
     Finally, the preprocessed words are joined back together into a single string, creating the final output.
+    All the steps are done by the shared 'analyzer', see the Analyzer class.
     '''
-    
-    # remove all punctuation
-    txt = re.sub(r'[^\w\s]', ' ', txt)
 
-    # tokenize the text
-    txt=txt.split()
-    
-    # remove stopwords
-    stop_words = set(stopwords.words('english'))
-    txt = [t for t in txt if t not in stop_words]
- 
-    # stemming
-    stemmer = PorterStemmer()
-    txt = [stemmer.stem(t) for t in txt]
- 
-    # reassemble the text
-    txt = ' '.join(txt)
-
-    return txt
+    return ' '.join(analyzer.analyze(txt))
 
 def convert_to_eur(fees, api_key):
     '''
@@ -109,7 +145,7 @@ def convert_to_eur(fees, api_key):
     conv="0.0"
     
     if len(c)>0:
-        base_url = "https://open.er-api.com/v6/latest"
+        base_url = service_urls["exchange_rates"] + "/v6/latest"
         conv=[]
         # convert all the values into euros 
         for i in range(len(v)):
@@ -121,27 +157,27 @@ def convert_to_eur(fees, api_key):
         conv=max(conv)
     return conv
 
-def fees_preprocessing(api_key):
+def fees_preprocessing(api_key, courses = None):
     '''
     Add to our .tsv files a new column that store a value representing the fee of the course. When there is no fee to get from
-    the 'fees' column we add NaN.
+    the 'fees' column we add NaN. The same column is added to the corpus store, if already created.
+    'courses' limits the work to a list of courses, for example the ones extracted again by 'parser.html_extraction'.
     '''
 
-    for i in tqdm(range(1, n_courses + 1)):
+    fees_eur = []
+    for i in tqdm(range(1, n_courses + 1) if courses is None else courses):
         tsv = "course_" + str(i) + ".tsv"
         file_path = os.path.join(tsvs_path, tsv)
-        with open(file_path, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        
-        fields = lines[1].strip().split('\t')
+        # the fields of the course, parsed as the corpus store does
+        fields = corpus.read_tsv(i)
         
         # read the TSV file into a DataFrame
         df = pd.read_csv(file_path, sep='\t')
 
-        # ensure that the list has enough elements to pick correct column
-        if len(fields) > 6:
+        # ensure that the course has the fees column
+        if 'fees' in fields:
             # get the fee value
-            f = convert_to_eur(fields[6], api_key)
+            f = convert_to_eur(fields['fees'], api_key)
         else:
             # otherwise placeholder value
             f = "0.0"
@@ -161,15 +197,24 @@ def fees_preprocessing(api_key):
 
         # save the modified DataFrame back to the same TSV file
         df.to_csv(file_path, sep='\t', index=False)
+        fees_eur.append(f)
+
+    # the store has the 'course_id' column before the columns of the .tsv files
+    if corpus.corpus_available() and courses is None:
+        corpus.set_column('fees (EUR)', fees_eur, position = 8)
+    elif corpus.corpus_available():
+        corpus.update_courses(courses)
 
     print("New 'fees (EUR)' column added to all .tsv files!")
 
-def create_vocabulary():
+def create_vocabulary(courses = None):
     '''
     To create the vocabulary, we begin by initializing an empty dictionary.
     For each of the 6000 tsv files, we extract the description field.
     After preprocessing the text, we iterate through each word, checking if it's already in the vocabulary.
     If not, we add it and assign a unique ID. Finally, the vocabulary is saved in a txt file.
+    Given the list of 'courses' changed since the last time (returned by 'parser.html_extraction') only their words are
+    added to the existing vocabulary. Words no longer used by any course are kept, they simply have no documents.
     '''
 
     # start an empty dictionary
@@ -177,18 +222,23 @@ def create_vocabulary():
     # start with term_id as 1
     term_id = 1
 
-    for i in tqdm(range(1, n_courses + 1)):
-        tsv="course_"+str(i)+".tsv"
-        file_path= os.path.join(tsvs_path,tsv)
-        with open(file_path, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        
-        fields = lines[1].strip().split('\t')
-        # ensure that the list has enough elements
-        if len(fields) > 4:
+    # update the existing vocabulary if only some courses changed
+    if courses is not None and os.path.exists(vocabulary_file_path):
+        vocabulary = load_vocabulary(vocabulary_file_path)
+        term_id = max(vocabulary.values(), default = 0) + 1
+    else:
+        courses = range(1, n_courses + 1)
+
+    # all the descriptions, from the corpus store if available
+    descriptions = corpus.read_field("description")
+
+    for i in tqdm(courses):
+        description = descriptions[i - 1]
+        # ensure that the course has a description
+        if description:
             
             # preprocess the description
-            d=preprocess_text(fields[4])
+            d=preprocess_text(description)
             # tokenize 
             words=d.split()
             
@@ -220,21 +270,39 @@ def load_vocabulary(file_path):
     
     return vocabulary
 
-def create_inverted_index(vocabulary):
+def create_inverted_index(vocabulary, courses = None):
+    '''
+    Create the inverted index mapping every term id to the sorted array of the doc ids of the courses whose description
+    contains it (the doc id of a course is its number, the N of 'course_N.tsv').
+    Given the list of 'courses' changed since the last time (returned by 'parser.html_extraction') the existing inverted
+    index is updated instead: those courses are removed from all the lists and indexed again.
+    '''
+
     # initialize an empty inverted_index
     inverted_index={}
 
-    for i in tqdm(range(1, n_courses + 1)):
-        tsv="course_"+str(i)+".tsv"
-        file_path= os.path.join(tsvs_path,tsv)
-        with open(file_path, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        
-        fields = lines[1].strip().split('\t')
-        # ensure that the list has enough elements
-        if len(fields) > 4:
+    # update the existing inverted index if only some courses changed
+    if courses is not None and os.path.exists(inv_index_file_path):
+        inverted_index = load_inverted_index(inv_index_file_path)
+        changed_courses = set(courses)
+        for id_term in list(inverted_index.keys()):
+            inverted_index[id_term] = array('I', [doc for doc in inverted_index[id_term] if doc not in changed_courses])
+            if len(inverted_index[id_term]) == 0:
+                del inverted_index[id_term]
+        courses = sorted(courses)
+    else:
+        courses = range(1, n_courses + 1)
+
+    # all the descriptions, from the corpus store if available
+    descriptions = corpus.read_field("description")
+
+    updated_terms = set()
+    for i in tqdm(courses):
+        description = descriptions[i - 1]
+        # ensure that the course has a description
+        if description:
             # access the description field and tokenize the words,
-            d=preprocess_text(fields[4])
+            d=preprocess_text(description)
             words=d.split()
             for w in words:
                 # check if the word contains alphabetical characters or numbers
@@ -242,16 +310,19 @@ def create_inverted_index(vocabulary):
                     # update inverted index
                     id_term = vocabulary[w]
                     if id_term not in inverted_index:
-                        inverted_index[id_term]=[tsv]
-                    else:
-                        if(tsv not in inverted_index[id_term]):
-                            inverted_index[id_term].append(tsv)
+                        inverted_index[id_term]=array('I', [i])
+                    # the courses are visited in order, so the course can only be the last one of the list
+                    elif inverted_index[id_term][-1] != i:
+                        inverted_index[id_term].append(i)
+                    updated_terms.add(id_term)
 
+    # as in a complete creation the lists are sorted by course number
+    if len(courses) < n_courses:
+        for id_term in updated_terms:
+            inverted_index[id_term] = array('I', sorted(inverted_index[id_term]))
 
     # save the inverted index in a file
-    with open(inv_index_file_path, 'w', encoding='utf-8') as inv_ind:
-        for word, term_id in inverted_index.items():
-            inv_ind.write(f"{word}\t{term_id}\n")
+    save_index(inverted_index, inv_index_file_path)
     
     print("Inverted index successfully created!")
 
@@ -259,6 +330,8 @@ def load_inverted_index(file_path):
     '''
     Function to load an already created inverted index.
     Works both for inverted index and inverted index tfidf.
+    The lists are parsed by 'parse_postings' instead of being evaluated as python code, see it for the loaded format.
+    The inverted index tfidf is loaded together with its forward index, saved next to it by 'save_index' (see InvertedIndexTfidf).
     '''
 
     inverted_index = {}
@@ -267,94 +340,190 @@ def load_inverted_index(file_path):
         for line in file:
             line = line.strip().split('\t')
             key = int(line[0])
-            value = eval(line[1])
+            value = parse_postings(line[1])
             inverted_index[key] = value
 
+    if any(isinstance(postings, tuple) for postings in inverted_index.values()):
+        inverted_index = InvertedIndexTfidf(inverted_index, load_forward_index(forward_index_path(file_path), inverted_index))
+
     return inverted_index
 
+def load_indexes(file_paths = None):
+    '''
+    Load vocabulary, inverted index and inverted index tfidf from their text files, by default the ones in the config file.
+    '''
+
+    if file_paths is None:
+        file_paths = (vocabulary_file_path, inv_index_file_path, inv_ind_tfidf_file_path)
+
+    return load_vocabulary(file_paths[0]), load_inverted_index(file_paths[1]), load_inverted_index(file_paths[2])
+
+# elements of the lists written in the inverted index files: 'course_N.tsv' or ('course_N.tsv', score), where numpy may have
+# written the score as np.float64(score)
+tsv_pattern = re.compile(r"'course_(\d+)\.tsv'")
+tfidf_pattern = re.compile(r"\('course_(\d+)\.tsv', (?:np\.float64\()?([^,()]+)\)?\)")
+
+def parse_postings(text):
+    '''
+    Parse the list of a line of an inverted index file. The .tsv files become an array of doc ids, the (.tsv file, score)
+    pairs of the inverted index tfidf become a pair of arrays (doc ids, scores).
+    '''
+
+    if text.startswith("[("):
+        pairs = tfidf_pattern.findall(text)
+        return array('I', [int(doc) for doc, _ in pairs]), array('d', [float(score) for _, score in pairs])
+
+    return array('I', [int(doc) for doc in tsv_pattern.findall(text)])
+
+def format_postings(postings):
+    '''
+    Inverse of 'parse_postings': write the list of a line of an inverted index file, where the courses are named by their
+    .tsv files as in the first version of the files.
+    '''
+
+    if isinstance(postings, tuple):
+        docs, scores = postings
+        return str([(doc_tsv(doc), float(score)) for doc, score in zip(docs, scores)])
+
+    return str([doc_tsv(doc) for doc in postings])
+
+def doc_tsv(doc_id):
+    '''
+    Name of the .tsv file of a doc id.
+    '''
+
+    return "course_" + str(doc_id) + ".tsv"
+
+def document_frequency(inverted_index, term_id):
+    '''
+    This function returns the number of documents containing a term, without decoding its list when the index is binary.
+    '''
+
+    if hasattr(inverted_index, "document_frequency"):
+        return inverted_index.document_frequency(term_id)
+    return len(inverted_index[term_id]) if term_id in inverted_index else 0
+
+def gallop_intersection(small, large):
+    '''
+    This function intersects two sorted lists of doc ids. For every doc id of the smaller list the larger one is searched
+    with exponential steps from the last position found, followed by a binary search, so the cost grows with the size of
+    the smaller list and only logarithmically with the larger one.
+    '''
+
+    result = array('I')
+    position = 0
+    n = len(large)
+    for doc_id in small:
+        position = gallop(large, doc_id, position)
+        if position == n:
+            break
+        if large[position] == doc_id:
+            result.append(doc_id)
+    return result
+
+def gallop(large, doc_id, position = 0):
+    '''
+    This function returns the first position, from 'position' on, of the sorted list 'large' whose doc id is not smaller
+    than 'doc_id' (the length of the list if there is none).
+    '''
+
+    # double the step until we overshoot the doc id, then bisect the last step
+    n = len(large)
+    step = 1
+    while position + step < n and large[position + step] < doc_id:
+        step *= 2
+    return bisect_left(large, doc_id, position, min(position + step + 1, n))
+
+def intersect_postings(query_words, vocabulary, inverted_index):
+    '''
+    This function returns the sorted doc ids of the documents containing all the words of the query. The lists are
+    intersected from the shortest to the longest, so the candidates only shrink, and the evaluation stops as soon as a
+    word is missing or no candidate is left: the longest lists are then never read.
+    '''
+
+    term_ids = set()
+    for w in query_words:
+        term_id = vocabulary.get(w)
+        if term_id is None or term_id not in inverted_index:
+            return array('I')
+        term_ids.add(term_id)
+
+    if len(term_ids) == 0:
+        return array('I')
+
+    # rarest terms first
+    ordered = sorted(term_ids, key = lambda term_id: document_frequency(inverted_index, term_id))
+
+    doc = inverted_index[ordered[0]]
+    for term_id in ordered[1:]:
+        if len(doc) == 0:
+            break
+        doc = gallop_intersection(doc, inverted_index[term_id])
+    return doc
+
 def search_engine(query, vocabulary, inverted_index, all_rows = False):
     '''
     This function return a dataframe containing only those documents which description column is related
     to the input query. The output is decided by a boolean variable as some times we want only certain
-    fields and other times we all of them.
+    fields and other times we all of them. The results are cached (see 'cache.py').
     '''
 
     query_words = preprocess_text(query).split()
+
+    # the documents depend only on the set of words of the query
+    key = ("search_engine", tuple(sorted(set(query_words))), all_rows)
+    return cache.cached(key, lambda: _search_engine(query_words, vocabulary, inverted_index, all_rows), (vocabulary, inverted_index))
+
+def _search_engine(query_words, vocabulary, inverted_index, all_rows):
     # this list will contain all the docs that have the complete query in their description
-    doc = set() 
-    for i in range(len(query_words)):
-        tmp=set() # we will need this to determine if a document contains all the query elements
-        w = query_words[i]
-        if w in vocabulary:
-            term_id = vocabulary[w]
-            if term_id in inverted_index:
-                t_id=inverted_index[term_id]
-                if i==0:
-                    doc.update(t_id)
-                else:
-                    tmp.update(t_id)
-       # filters out the documents that don't contain the previous word of the query
-        if i>0:
-            doc=doc.intersection(doc, tmp)
-
-    # extract information from matching documents
-    result_data = []
-    for tsv_id in doc:
-        tsv_file = os.path.join(tsvs_path, f"{tsv_id}")
-        with open(tsv_file, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
-        fields=lines[1].split("\t")
-        if all_rows:
-            result_data.append({
-                        'courseName': fields[0],
-                        'universityName': fields[1],
-                        'facultyName': fields[2],
-                        'isItFullTime': fields[3],
-                        'description': fields[4],
-                        'startDate': fields[5],
-                        'fees': fields[6],
-                        'fees (EUR)': fields[7],
-                        'modality': fields[8],
-                        'duration': fields[9],
-                        'city': fields[10],
-                        'country': fields[11],
-                        'administration': fields[12],
-                        'url': fields[13]
-            })
+    doc = intersect_postings(query_words, vocabulary, inverted_index)
+    return search_results(doc, all_rows)
 
-        else:
-            result_data.append({
-                        'courseName': fields[0],
-                        'universityName': fields[1],
-                        'description': fields[4],
-                        'url': fields[-1]
-            })
+def search_results(doc, all_rows = False):
+    '''
+    This function returns the dataframe of 'search_engine' for the matching documents in 'doc'.
+    '''
+
+    # extract information from matching documents, reading only the needed columns of the matching courses from the
+    # corpus store (or from their .tsv files, see 'corpus.get_rows')
+    if all_rows:
+        columns = ['courseName', 'universityName', 'facultyName', 'isItFullTime', 'description', 'startDate', 'fees', 'fees (EUR)', 'modality', 'duration', 'city', 'country', 'administration', 'url']
+    else:
+        columns = ['courseName', 'universityName', 'description', 'url']
+    result_data = corpus.get_rows(list(doc), columns)
 
     # create pandas DataFrame
-    result_df = pd.DataFrame(result_data)
-    return result_df
+    return pd.DataFrame(result_data, columns = columns)
+
+def create_inverted_index_tfidf(vocabulary, courses = None):
+    '''
+    Create the inverted index storing for every term id the doc ids of the courses containing it and their tf-idf scores,
+    as a pair of arrays.
+    The idf of a term depends on all the courses, so when some courses changed the index is created again from scratch;
+    it is skipped only when 'courses' (returned by 'parser.html_extraction') is an empty list and the index already exists.
+    '''
+
+    if courses is not None and len(courses) == 0 and os.path.exists(inv_ind_tfidf_file_path):
+        print("No course changed. Using the existing inverted index TF-IDF.")
+        return
 
-def create_inverted_index_tfidf(vocabulary):
     # initialize the inverted index with tf-idf scores 
     inv_index_tfidf = {}
     # initialize dictionaries for term frequency (t_f) and document frequency (d_f)
     t_f = {}
     d_f = {}
 
+    # all the descriptions, from the corpus store if available
+    descriptions = corpus.read_field("description")
+
     # step 1: Calculate term frequency (tf) and inverse document frequency (idf)
     for i in tqdm(range(1, n_courses + 1)):
-        tsv="course_"+str(i)+".tsv"
-        file_path= os.path.join(tsvs_path,tsv)
-        with open(file_path, 'r', encoding='utf-8') as ff:
-            lines=ff.readlines()
+        description = descriptions[i - 1]
         
-        # extract the fields from the second line
-        fields = lines[1].strip().split('\t')
-        
-        # ensure that the list has enough elements
-        if len(fields) > 4:
+        # ensure that the course has a description
+        if description:
             # access the description field and tokenize the words, 
-            words=preprocess_text(fields[4]).split()
+            words=preprocess_text(description).split()
 
             # calculate term frequency (tf) for each term in the document
             for w in words:
@@ -363,8 +532,8 @@ def create_inverted_index_tfidf(vocabulary):
                     # if the pair doesn't exist  it is initialized with a count of 0 before incrementing.
                     # If the pair already exists, it doesn't override the existing value; 
                     # it simply returns the existing value associated with that key.
-                    t_f.setdefault((term_id, tsv), 0) 
-                    t_f[(term_id, tsv)] += 1
+                    t_f.setdefault((term_id, i), 0) 
+                    t_f[(term_id, i)] += 1
 
             # update document frequency for each term
             seen_words = set()
@@ -383,28 +552,330 @@ def create_inverted_index_tfidf(vocabulary):
         # calculate tf-idf score
         tfidf = np.round(tf * idf,2)
         
-        # update the inverted index with the term_id and the corresponding tuple
-        inv_index_tfidf.setdefault(term_id, [])
-        inv_index_tfidf[term_id].append((doc_id, tfidf))
+        # update the inverted index with the doc id and the corresponding score
+        docs, scores = inv_index_tfidf.setdefault(term_id, (array('I'), array('d')))
+        docs.append(doc_id)
+        scores.append(tfidf)
 
     # save the inverted index in a file
-    with open(inv_ind_tfidf_file_path, 'w', encoding='utf-8') as tfidf:
-        for word, term_id in inv_index_tfidf.items():
-            tfidf.write(f"{word}\t{term_id}\n")
+    save_index(inv_index_tfidf, inv_ind_tfidf_file_path)
 
     print("Inverted index TF-IDF successfully created!")
 
-def top_k_documents(query, vocabulary, inverted_index, inverted_index_tfidf, k = 5):
+def create_indexes(field = "description", file_paths = None, documents = None):
+    '''
+    Create vocabulary, inverted index and inverted index tfidf together, reading and preprocessing every course only once
+    instead of once for each of 'create_vocabulary', 'create_inverted_index' and 'create_inverted_index_tfidf'. The three
+    files have the same format, term ids and scores written by those functions.
+    'field' is the column of the courses to index and 'file_paths' the (vocabulary, inverted index, inverted index tfidf)
+    paths, by default the description and the paths in the config file. 'documents' can give the (doc id, words) pairs
+    already preprocessed, in order of course.
+    '''
+
+    if file_paths is None:
+        file_paths = (vocabulary_file_path, inv_index_file_path, inv_ind_tfidf_file_path)
+
+    if documents is None:
+        documents = analyze_field(field)
+
+    for index, file_path in zip(build_indexes(documents), file_paths):
+        save_index(index, file_path)
+
+    print("Vocabulary, inverted index and inverted index TF-IDF successfully created!")
+
+def analyze_field(field = "description"):
+    '''
+    Yield the (doc id, preprocessed words) pair of every course with a non empty 'field', in order of course.
+    '''
+
+    # all the values, from the corpus store if available
+    values = corpus.read_field(field)
+
+    for i in tqdm(range(1, n_courses + 1)):
+        if values[i - 1]:
+            yield i, analyzer.analyze(values[i - 1])
+
+def build_indexes(documents):
+    '''
+    Build in a single pass over the (doc id, words) pairs in 'documents' the vocabulary, the inverted index and the inverted
+    index tfidf, returned as dictionaries. Term ids are given in order of first appearance, as in 'create_vocabulary'.
+    Every list of the inverted index is an array of doc ids, every list of the inverted index tfidf a pair of arrays (doc ids, scores).
+    '''
+
+    vocabulary = {}
+    inverted_index = {}
+    # term frequency of every (term_id, doc id) pair and document frequency of every term
+    t_f = {}
+    d_f = {}
+
+    for doc_id, words in documents:
+        for w in words:
+            term_id = vocabulary.get(w)
+            if term_id is None:
+                term_id = len(vocabulary) + 1
+                vocabulary[w] = term_id
+
+            # the documents arrive in order, so a document is already in the list only if it is the last one
+            postings = inverted_index.setdefault(term_id, array('I'))
+            if len(postings) == 0 or postings[-1] != doc_id:
+                postings.append(doc_id)
+                d_f[term_id] = d_f.get(term_id, 0) + 1
+
+            t_f[(term_id, doc_id)] = t_f.get((term_id, doc_id), 0) + 1
+
+    # calculate tf-idf as in 'create_inverted_index_tfidf'
+    inv_index_tfidf = {}
+    for (term_id, doc_id), tf in t_f.items():
+        idf = np.log(n_courses / (d_f[term_id] + 1))
+        docs, scores = inv_index_tfidf.setdefault(term_id, (array('I'), array('d')))
+        docs.append(doc_id)
+        scores.append(np.round(tf * idf, 2))
+
+    return vocabulary, inverted_index, InvertedIndexTfidf(inv_index_tfidf)
+
+def save_index(index, file_path):
+    '''
+    Save a vocabulary or an inverted index in a text file, one key and its value for every line. The forward index of an
+    inverted index tfidf is saved next to it (see 'forward_index_path').
+    '''
+
+    with open(file_path, 'w', encoding = 'utf-8') as file:
+        for key, value in index.items():
+            file.write(f"{key}\t{value if isinstance(value, int) else format_postings(value)}\n")
+
+    if any(isinstance(value, tuple) for value in index.values()):
+        save_forward_index(get_forward_index(index)[0], forward_index_path(file_path))
+
+class ForwardIndex:
+    '''
+    Forward index of an inverted index tfidf: for every doc id the term ids of the document, sorted, with their tf-idf scores,
+    so that the cosine similarity of a document only needs the scores of the query terms. It also stores the norms of the
+    tf-idf vectors of the documents ('doc_norms', indexed by doc id) and for every term id the highest contribution of the
+    term to the cosine similarity of a document ('max_scores', see 'term_impacts'), that bounds the score a document can
+    get from the term. It is built by 'build_forward_index' together with the inverted index tfidf.
+    '''
+
+    def __init__(self, doc_starts, term_ids, scores, doc_norms, max_scores):
+        # the terms of doc id d are the ones from doc_starts[d] to doc_starts[d + 1]
+        self.doc_starts = doc_starts
+        self.term_ids = term_ids
+        self.scores = scores
+        self.doc_norms = doc_norms
+        self.max_scores = max_scores
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.doc_starts)))
+
+    def __contains__(self, doc_id):
+        return 0 <= doc_id < len(self.doc_starts) - 1 and self.doc_starts[doc_id + 1] > self.doc_starts[doc_id]
+
+    def __getitem__(self, doc_id):
+        # the tf-idf vector of the document, as the dictionary term id -> score
+        if doc_id not in self:
+            raise KeyError(doc_id)
+        start, end = int(self.doc_starts[doc_id]), int(self.doc_starts[doc_id + 1])
+        return dict(zip(self.term_ids[start:end].tolist(), self.scores[start:end].tolist()))
+
+class InvertedIndexTfidf(dict):
+    '''
+    Inverted index tfidf as the dictionary term id -> (doc ids, scores), with its forward index in 'forward_index'. Without
+    'forward_index' it is built from the lists.
+    '''
+
+    def __init__(self, lists, forward_index = None):
+        super().__init__(lists)
+        self.forward_index = build_forward_index(self) if forward_index is None else forward_index
+
+def build_forward_index(inverted_index_tfidf):
+    '''
+    This function builds, in a single pass over the inverted index tfidf, its forward index (see ForwardIndex).
+    '''
+
+    term_ids = []
+    all_docs = []
+    all_scores = []
+    for term_id, (docs, scores) in inverted_index_tfidf.items():
+        term_ids.append(term_id)
+        all_docs.append(np.asarray(docs, dtype = np.int64))
+        all_scores.append(np.asarray(scores, dtype = np.float64))
+
+    if len(term_ids) == 0:
+        return ForwardIndex(np.zeros(1, dtype = np.int64), np.zeros(0, dtype = np.uint32), np.zeros(0), np.zeros(0), np.zeros(0))
+
+    lengths = [len(docs) for docs in all_docs]
+    terms = np.repeat(np.array(term_ids, dtype = np.int64), lengths)
+    docs = np.concatenate(all_docs)
+    scores = np.concatenate(all_scores)
+    doc_norms = np.sqrt(np.bincount(docs, weights = scores * scores))
+
+    # contributions of every term to the documents and their maximum for every term
+    norms = doc_norms[docs]
+    impacts = np.divide(scores, norms, out = np.zeros(len(norms)), where = norms != 0)
+    max_scores = np.zeros(max(term_ids) + 1)
+    max_scores[term_ids] = np.maximum.reduceat(impacts, np.cumsum([0] + lengths[:-1]))
+
+    order = np.lexsort((terms, docs))
+    doc_starts = np.searchsorted(docs[order], np.arange(len(doc_norms) + 1))
+    return ForwardIndex(doc_starts.astype(np.int64), terms[order].astype(np.uint32), scores[order], doc_norms, max_scores)
+
+def forward_index_path(inverted_index_tfidf_path):
+    '''
+    Path of the forward index of an inverted index tfidf, next to its file.
+    '''
+
+    return os.path.splitext(inverted_index_tfidf_path)[0] + "_forward.npz"
+
+def save_forward_index(forward_index, file_path):
+    '''
+    Save a forward index in a numpy .npz file.
+    '''
+
+    with open(file_path, 'wb') as file:
+        np.savez(file, doc_starts = forward_index.doc_starts, term_ids = forward_index.term_ids, scores = forward_index.scores,
+                 doc_norms = forward_index.doc_norms, max_scores = forward_index.max_scores)
+
+def load_forward_index(file_path, inverted_index_tfidf):
+    '''
+    Load the forward index of 'inverted_index_tfidf' from its file. When the file is missing (indexes created before the
+    forward index was saved with them) or does not have as many scores as the lists, it is built from the lists.
+    '''
+
+    if os.path.exists(file_path):
+        with np.load(file_path) as arrays:
+            forward_index = ForwardIndex(arrays["doc_starts"], arrays["term_ids"], arrays["scores"], arrays["doc_norms"], arrays["max_scores"])
+        if len(forward_index.scores) == sum(len(docs) for docs, _ in inverted_index_tfidf.values()):
+            return forward_index
+
+    return build_forward_index(inverted_index_tfidf)
+
+def get_forward_index(inverted_index_tfidf):
+    '''
+    This function returns forward index and document norms of an inverted index tfidf, loaded or built together with it.
+    An inverted index tfidf given as a plain dictionary has its forward index built now.
+    '''
+
+    forward_index = getattr(inverted_index_tfidf, "forward_index", None)
+    if forward_index is None:
+        forward_index = build_forward_index(inverted_index_tfidf)
+    return forward_index, forward_index.doc_norms
+
+def term_impacts(docs, scores, doc_norms):
+    '''
+    This function returns the contribution of a term to the cosine similarity of each of its documents 'docs': its score
+    divided by the norm of the document.
+    '''
+
+    norms = doc_norms[np.asarray(docs, dtype = np.int64)]
+    return np.divide(np.asarray(scores, dtype = np.float64), norms, out = np.zeros(len(norms)), where = norms != 0)
+
+def top_k_pruned(query_words, query_vector, vocabulary, inverted_index_tfidf, k):
+    '''
+    This function returns, as a sorted list of (-score, doc id) pairs, the 'k' documents containing all the words of the
+    query with the highest cosine similarity, the same ones (with the same scores) found by scoring every document.
+    Every term contributes to the score at most its maximum contribution (see 'term_impacts'), so every document
+    of the rarest term has an upper bound: its contribution of the rarest term plus the maximum contributions of the
+    others. The documents are visited in blocks, from the highest bounds, and a block is checked against the other terms
+    one at a time, replacing their maximum contributions with the real ones and dropping the documents whose bound can
+    no longer beat the k-th score found so far (MaxScore). The search ends at the first block whose best bound cannot.
+    Returns None when the pruning cannot be applied (documents or query with null norm) and every document has to be scored.
+    '''
+
+    if k <= 0:
+        return []
+
+    forward_index, doc_norms = get_forward_index(inverted_index_tfidf)
+    max_scores = forward_index.max_scores
+
+    # weight of every term in the query (a word repeated in the query adds its weights)
+    query_terms = []
+    weights = {}
+    for i, w in enumerate(query_words):
+        term_id = vocabulary.get(w)
+        if term_id is None or term_id not in inverted_index_tfidf:
+            return []
+        query_terms.append(term_id)
+        weights[term_id] = weights.get(term_id, 0.0) + (query_vector[i] if i < len(query_vector) else 0.0)
+
+    norm_query = np.linalg.norm(query_vector)
+    if len(query_terms) == 0 or norm_query == 0:
+        return None
+
+    # rarest term first: its documents are the candidates
+    term_lists = {term_id: tuple(np.asarray(values) for values in inverted_index_tfidf[term_id]) for term_id in weights}
+    terms = sorted(weights, key = lambda term_id: len(term_lists[term_id][0]))
+    lists = [term_lists[term_id] for term_id in terms]
+    impacts = {term_id: term_impacts(*term_lists[term_id], doc_norms) for term_id in terms}
+    candidates = lists[0][0].astype(np.int64)
+    if np.any(doc_norms[candidates] == 0):
+        return None
+
+    # upper bound of the score of every candidate
+    rest_max = sum(weights[term_id] * max_scores[term_id] for term_id in terms[1:])
+    bounds = (weights[terms[0]] * impacts[terms[0]] + rest_max) / norm_query
+    order = np.argsort(-bounds, kind = "stable")
+
+    # the bounds are computed in a different order than the scores: a small margin keeps the rounding errors safe
+    margin = 1e-9
+
+    heap = [] # the k best (score, -doc id) so far, the worst on top
+    start = 0
+    block_size = max(4 * k, 64)
+    while start < len(order):
+        block = order[start:start + block_size]
+        start += block_size
+        block_size *= 2
+
+        threshold = heap[0][0] if len(heap) == k else -np.inf
+        if bounds[block[0]] + margin < threshold:
+            break
+        block = block[bounds[block] + margin >= threshold]
+
+        docs = candidates[block]
+        bound = bounds[block] * norm_query
+        found = [lists[0][1][block]] # scores of the terms in the documents still in the block
+        for t in range(1, len(terms)):
+            term_docs, term_scores = lists[t]
+            positions = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+            bound = bound + weights[terms[t]] * (impacts[terms[t]][positions] - max_scores[terms[t]])
+            keep = (term_docs[positions] == docs) & (bound / norm_query + margin >= threshold)
+
+            docs = docs[keep]
+            bound = bound[keep]
+            found = [scores[keep] for scores in found] + [term_scores[positions[keep]]]
+
+        # exact scores, computed as in 'top_k_documents'
+        term_scores = dict(zip(terms, found))
+        prod = np.zeros(len(docs))
+        for i in range(len(query_vector)):
+            prod = prod + query_vector[i] * term_scores[query_terms[i]]
+        scores = prod / (doc_norms[docs] * norm_query)
+
+        for score, doc_id in zip(scores.tolist(), docs.tolist()):
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -doc_id))
+            elif (score, -doc_id) > heap[0]:
+                heapq.heapreplace(heap, (score, -doc_id))
+
+    return sorted((-score, -doc_id) for score, doc_id in heap)
+
+def top_k_documents(query, vocabulary, inverted_index, inverted_index_tfidf, k = 5, pruning = True):
     '''
     This function takes a query, remove all the unrelated documents and for every remaining documents
     calculate it's cosine similarity between the query and the description field. Then it returns only
     the first 'k' documents in order of similarity. Sometimes we want all the documents and not only
     the first 'k', so we created an alternative output for when k = "all".
+    With 'pruning' the first 'k' documents are found by 'top_k_pruned', that skips the documents that
+    cannot enter them, instead of scoring every document. The results are cached (see 'cache.py').
     '''
 
     # preprocess and tokenize the query
     query_words = preprocess_text(query)
-    
+
+    # the query vector pairs its weights with the words in the order of the query, so the order is part of the key
+    key = ("top_k_documents", tuple(query_words.split()), k)
+    return cache.cached(key, lambda: _top_k_documents(query_words, vocabulary, inverted_index, inverted_index_tfidf, k, pruning), (vocabulary, inverted_index, inverted_index_tfidf))
+
+def _top_k_documents(query_words, vocabulary, inverted_index, inverted_index_tfidf, k, pruning):
     # vectorize the query
     vectorizer = TfidfVectorizer()
     X = vectorizer.fit_transform([query_words])
@@ -412,79 +883,58 @@ def top_k_documents(query, vocabulary, inverted_index, inverted_index_tfidf, k =
 
     # tokenize the query
     query_words=query_words.split()
-    
-    # find documents that contain all words in the query
-    doc = set()
-    for i in range(len(query_words)):
-        tmp=set() 
-        w = query_words[i]
-        if w in vocabulary:
-            term_id = vocabulary[w]
-            if term_id in inverted_index:
-                t_id=inverted_index[term_id]
-                if i==0:
-                    doc.update(t_id)
-                else:
-                    tmp.update(t_id)
-        if i>0:
-            doc=doc.intersection(doc, tmp)    
-
-    # calculate cosine similarity for each matching document
-    heap = []
-    for doc_id in doc:
-        doc_vector = {}
-        # aggregate tf-idf scores for each term in the document
-        for term_id, tfidf in inverted_index_tfidf.items():
-            for doc, score in tfidf:
-                if doc == doc_id:
-                    doc_vector[term_id] = score
-
-        # calculate the cosine similarity
-        prod = 0.0
-        for i in range(len(query_vector)):
-            prod += query_vector[i] * doc_vector[vocabulary[query_words[i]]] 
-        norm_doc = np.linalg.norm(np.array(list(doc_vector.values()))) 
-        norm_query = np.linalg.norm(query_vector) 
-        if norm_doc != 0 and norm_query != 0:
-            score = prod / (norm_doc * norm_query)
-        
-        # add the document information and similarity score to the heap
-        heapq.heappush(heap, (-score, doc_id))
-    
+
+    heap = rank_documents(query_words, query_vector, vocabulary, inverted_index, inverted_index_tfidf, k, pruning)
+    return top_k_results(heap, k)
+
+def top_k_results(heap, k):
+    '''
+    This function returns the dataframe of 'top_k_documents' for the heap of (-score, doc id) pairs given by 'rank_documents'.
+    '''
+
+    # get the first k documents (or all of them) and read their fields from the corpus store (or from their .tsv files,
+    # see 'corpus.get_rows')
     result_documents = []
-    if k == "all":
-        # get all documents
-        for i in range(len(heap)):
-            similarity_score, doc_id = heapq.heappop(heap)
-            
-            tsv_file = os.path.join(tsvs_path, f"{doc_id}")
-            with open(tsv_file, 'r', encoding='utf-8') as ff:
-                lines=ff.readlines()
-            fields=lines[1].split("\t")
-            result_documents.append({
-                        'similarityScore': -similarity_score,  # Convert back to positive
-                        'courseName': fields[0],
-                        'universityName': fields[1],
-                        'description': fields[4],
-                        'url': fields[-1]
-            })
+    ranked = [heapq.heappop(heap) for i in range(len(heap) if k == "all" else min(k, len(heap)))]
+    rows = corpus.get_rows([doc_id for _, doc_id in ranked], ['courseName', 'universityName', 'description', 'url'])
+    for (similarity_score, _), row in zip(ranked, rows):
+        result_documents.append({'similarityScore': -similarity_score, **row})  # Convert back to positive
 
-    else:
-        # get the top-k documents
-        for i in range(min(k,len(heap))):
-            similarity_score, doc_id = heapq.heappop(heap)
-            
-            tsv_file = os.path.join(tsvs_path, f"{doc_id}")
-            with open(tsv_file, 'r', encoding='utf-8') as ff:
-                lines=ff.readlines()
-            fields=lines[1].split("\t")
-            result_documents.append({
-                        'similarityScore': -similarity_score,  # Convert back to positive
-                        'courseName': fields[0],
-                        'universityName': fields[1],
-                        'description': fields[4],
-                        'url': fields[-1]
-            })
-            
     # return pandas DataFrame
-    return pd.DataFrame(result_documents)
\ No newline at end of file
+    return pd.DataFrame(result_documents)
+
+def rank_documents(query_words, query_vector, vocabulary, inverted_index, inverted_index_tfidf, k, pruning = True):
+    '''
+    This function returns as a heap the (-score, doc id) pairs of the documents containing all the words of the query,
+    scored with the query vector of 'top_k_documents': at least the first 'k' of them, all of them if k = "all".
+    '''
+
+    heap = None
+    if pruning and k != "all":
+        # only the first k documents are needed: skip those that cannot enter them
+        heap = top_k_pruned(query_words, query_vector, vocabulary, inverted_index_tfidf, k)
+
+    if heap is None:
+        # find documents that contain all words in the query
+        doc = intersect_postings(query_words, vocabulary, inverted_index)
+
+        # calculate cosine similarity for each matching document
+        forward_index, doc_norms = get_forward_index(inverted_index_tfidf)
+        heap = []
+        for doc_id in doc:
+            # tf-idf scores of the terms in the document
+            doc_vector = forward_index[doc_id]
+
+            # calculate the cosine similarity
+            prod = 0.0
+            for i in range(len(query_vector)):
+                prod += query_vector[i] * doc_vector[vocabulary[query_words[i]]] 
+            norm_doc = doc_norms[doc_id]
+            norm_query = np.linalg.norm(query_vector) 
+            if norm_doc != 0 and norm_query != 0:
+                score = prod / (norm_doc * norm_query)
+            
+            # add the document information and similarity score to the heap
+            heapq.heappush(heap, (-score, doc_id))
+
+    return heap
@@ -1,6 +1,7 @@
 # import config
 from functions.config import *
 from functions import engine
+from functions import cache
 
 # import libraries
 import pandas as pd
@@ -52,10 +53,18 @@ def calculate_start_date_score(start_date):
         return -1
 
 def scoring_function(query, vocabulary, inverted_index, inverted_index_tfidf, k = 5, all_columns = False):
+    # the results are cached (see 'cache.py'): the start date scores depend on the current month, that is part of the key
+    key = ("scoring_function", tuple(engine.analyzer.analyze(query)), k, all_columns, pd.to_datetime('today').month)
+    return cache.cached(key, lambda: _scoring_function(query, vocabulary, inverted_index, inverted_index_tfidf, k, all_columns), (vocabulary, inverted_index, inverted_index_tfidf))
+
+def _scoring_function(query, vocabulary, inverted_index, inverted_index_tfidf, k, all_columns):
     # create necessary dataframes
     result_df = engine.search_engine(query, vocabulary, inverted_index, all_rows = True)
     similarities_scores = engine.top_k_documents(query, vocabulary, inverted_index, inverted_index_tfidf, k = "all")
 
+    # the query is preprocessed only once
+    query_words = engine.analyzer.analyze(query)
+
     # use a heap to maintain the top-k documents
     heap = []
     for _, row in result_df.iterrows():
@@ -64,7 +73,7 @@ def scoring_function(query, vocabulary, inverted_index, inverted_index_tfidf, k
         score_description = similarities_scores[similarities_scores["url"] == row["url"]]["similarityScore"].item()
        
         # score based on the presence of any part of the query in the course name
-        score_course_name = any(word in engine.preprocess_text(row['courseName']) for word in engine.preprocess_text(query).split())
+        score_course_name = any(word in engine.preprocess_text(row['courseName']) for word in query_words)
         
         # score based on the presence of empty rows
         if (row.isnull().any().any() or row.isna().any().any() or (type(row['fees (EUR)']) == type("") and row['fees (EUR)'] == "") or (type(row['fees (EUR)']) == type(pd.Series()) and row['fees (EUR)'].empty)):
@@ -105,9 +114,8 @@ def scoring_function(query, vocabulary, inverted_index, inverted_index_tfidf, k
     heap.sort(reverse=True)
 
     # create a DataFrame from the heap
-    if all_columns:
-        top_k_df = pd.DataFrame(heap, columns=['total_score', 'courseName', 'universityName', 'city', 'country', 'description', 'fees (EUR)', 'url'])
-    else:
-        top_k_df = pd.DataFrame(heap, columns=['total_score', 'courseName', 'universityName', 'description', 'url'])
+    top_k_df = pd.DataFrame(heap, columns=['total_score', 'courseName', 'universityName', 'city', 'country', 'description', 'fees (EUR)', 'url'])
+    if not all_columns:
+        top_k_df = top_k_df[['total_score', 'courseName', 'universityName', 'description', 'url']]
 
     return top_k_df
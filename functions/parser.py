@@ -1,102 +1,329 @@
 # import config
 from functions.config import *
+from functions.archive import open_archive
+from functions import corpus
+from functions import engine
 
 # import libraries
 import os
 from bs4 import BeautifulSoup
 from tqdm.notebook import tqdm
 import csv
+import concurrent.futures
+import random
+import lxml.html
+import lxml.etree
+import hashlib
+import json
 
-def html_extraction():
+# version of the extracted fields, to be increased whenever 'extract_fields' and 'fast_extract_fields' change their output
+# so that all the courses are extracted again
+extractor_version = 1
+
+def html_extraction(use_archive = use_page_archive, parallel = False, n_workers = None, chunk_size = 50, backend = "html.parser", api_key = None):
     '''
     This function open one by one all the html files and extract all the useful informations we need from them.
-    Extracted informations are then saved in .tsvs files
-    We avoid repeating extractions if files are already present.
+    Extracted informations are then saved in .tsvs files, which are finally collected in the corpus store (see functions/corpus.py).
+    We avoid repeating extractions: the extraction manifest keeps the hash of the page every .tsv file comes from and the
+    version of the extractor, so only the courses whose page changed (for example after 'crawler.refresh_pages'), whose
+    .tsv file is missing or that were extracted by an older extractor are extracted again.
     We notice that some fields are always present while others are not. Those two kinds are treated differently.
+    With 'use_archive' the pages are read from the compressed page archive instead of the loose .html files.
+    With 'parallel' the courses are divided in chunks of 'chunk_size' courses shared among 'n_workers' processes (by default
+    one for every core). Every course is still written in its own .tsv file, so the result is the same of the sequential extraction.
+    With backend = "lxml" the pages are parsed by the faster extractor 'fast_extract_fields' instead of BeautifulSoup.
+    A course extracted again keeps its converted fee ('fees (EUR)', see 'engine.fees_preprocessing') if its fees did not
+    change; the courses whose fees changed are converted again with 'api_key' if given, otherwise they are listed.
+    Returns the sorted list of the extracted courses, to be given to the functions building the indexes (see functions/engine.py)
+    so that they update only those courses.
     '''
 
     # create folder if not exist already
     if not os.path.exists(tsvs_path):
         os.makedirs(tsvs_path)
 
-    # we check if all the files already exists, in this case we do not repeat the crawling
-    to_crawl = False
-    files_count = 0
-    for _, _, files in os.walk(tsvs_path):
-        files_count += len(files)
+    manifest = load_extraction_manifest()
+
+    # a course is extracted again if its .tsv file is missing or if it does not come from the current page and extractor
+    jobs = []
+    with open(courses_urls_path, 'r') as courses_file, open_archive(use_archive, read_only = True) as page_archive:
+        for i, url in enumerate(courses_file):
+            tsv_file_path = tsvs_path + "course_" + str(1 + i) + ".tsv"
+            entry = manifest.get(str(1 + i))
+            if entry is None or not os.path.exists(tsv_file_path) or entry["version"] != extractor_version or entry["hash"] != page_hash(_read_page(1 + i, page_archive)):
+                jobs.append((1 + i, url.strip("\n")))
 
-    if files_count < n_courses:
+    if len(jobs) > 0:
         print("Creating .tsv files...")
-        to_crawl = True
     else:
         print("All files already created. Using the existing version.")
 
-    # if data is missing go crawl
-    if to_crawl == True:
-        with open(courses_urls_path, 'r') as courses_file:
-            for i, url in tqdm(enumerate(courses_file), total = n_courses):
-                url = url.strip("\n")
-
-                # if file .tsv already exist skip its creation
-                tsv_file_path = tsvs_path + "course_" + str(1 + i) + ".tsv"
-                if os.path.exists(tsv_file_path):
-                    continue
-
-                # create path, open and read .html file
-                course_file_path = courses_pages_path + "page_" + str(1 + i // courses_per_page) + "/" + "course_" + str(1 + i % courses_per_page) + ".html"
-                with open(course_file_path, 'r', encoding = "utf-8") as html_file:
-                    html_content = html_file.read()
-
-                soup = BeautifulSoup(html_content, "html.parser")
-
-                # if the page is no avaiable we can't get informations
-                if soup.title.text == r"FindAMasters | 500 Error : Internal Server Error":
-                    courseName = universityName = facultyName = isItFullTime = description = startDate = fees = modality = duration = city = country = administration = ""
-
-                else:
-                    # get all the required fields
-
-                    courseName = soup.find("h1", {"class": "course-header__course-title"}).get_text(strip = True, separator = " ")
-                    universityName = soup.find("a", {"class": "course-header__institution"}).get_text(strip = True, separator = " ")
-                    facultyName = soup.find("a", {"class": "course-header__department"}).get_text(strip = True, separator = " ")
-
-                    # some entries do not have this field
-                    extract = soup.find("span", {"class": "key-info__study-type"})
-                    if extract is None:
-                        isItFullTime = ""
-                    else:
-                        isItFullTime = extract.get_text(strip = True, separator = " ")
-
-                    description = soup.find("div", {"class": "course-sections__description"}).find("div", {"class": "course-sections__content"}).get_text(strip = True, separator = " ")
-                    startDate = soup.find("span", {"class": "key-info__start-date"}).get_text(strip = True, separator = " ")
-
-                    # some entries do not have this field
-                    extract = soup.find("div", {"class": "course-sections__fees"})
-                    if extract is None:
-                        fees = ""
-                    else:
-                        fees = extract.find("div", {"class": "course-sections__content"}).get_text(strip = True, separator = " ")
-
-                    modality = soup.find("span", {"class": "key-info__qualification"}).get_text(strip = True, separator = " ")
-                    duration = soup.find("span", {"class": "key-info__duration"}).get_text(strip = True, separator = " ")
-                    city = soup.find("a", {"class": "course-data__city"}).get_text(strip = True, separator = " ")
-                    country = soup.find("a", {"class": "course-data__country"}).get_text(strip = True, separator = " ")
-
-                    # courses can be 'on_campus', 'online' or both, but this information is stored in different tags
-                    extract1 = soup.find("a", {"class": "course-data__online"})
-                    extract2 = soup.find("a", {"class": "course-data__on-campus"})
-                    if extract1 is None and extract2 is None:
-                        administration = ""
-                    elif extract2 is None:
-                        administration = extract1.get_text(strip = True, separator = " ")
-                    elif extract1 is None:
-                        administration = extract2.get_text(strip = True, separator = " ")
-                    else:
-                        administration = extract1.get_text(strip = True, separator = " ") + " & " + extract2.get_text(strip = True, separator = " ")
-
-                data = [["courseName", "universityName", "facultyName", "isItFullTime", "description", "startDate", "fees", "modality", "duration", "city", "country", "administration", "url"],
-                        [courseName, universityName, facultyName, isItFullTime, description, startDate, fees, modality, duration, city, country, administration, url]]
-
-                with open(tsv_file_path, 'w+', newline='') as tsv_file:
-                    writer = csv.writer(tsv_file, delimiter = '\t', lineterminator = '\n')
-                    writer.writerows(data)
\ No newline at end of file
+    # courses whose converted fee has to be computed again
+    changed_fees = []
+
+    if parallel == False:
+        entries, changed_fees = _extract_courses(jobs, use_archive, backend, progress = True)
+        manifest.update(entries)
+
+    else:
+        # every process receives a contiguous chunk of courses, each course is written in its own file by a single process
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        with concurrent.futures.ProcessPoolExecutor(n_workers) as executor:
+            futures = [executor.submit(_extract_courses, chunk, use_archive, backend) for chunk in chunks]
+            for future in tqdm(concurrent.futures.as_completed(futures), total = len(futures)):
+                entries, chunk_changed_fees = future.result()
+                manifest.update(entries)
+                changed_fees += chunk_changed_fees
+
+    if len(jobs) > 0:
+        save_extraction_manifest(manifest)
+
+    changed_courses = sorted(course for course, _ in jobs)
+
+    # collect all the .tsv files in the corpus store used by the other modules
+    if not corpus.corpus_available():
+        corpus.build_corpus_store()
+    elif len(changed_courses) > 0:
+        corpus.update_courses(changed_courses)
+
+    changed_fees.sort()
+    if len(changed_fees) > 0 and api_key is not None:
+        engine.fees_preprocessing(api_key, changed_fees)
+    elif len(changed_fees) > 0:
+        print("The fees of courses " + ", ".join(str(course) for course in changed_fees) + " changed, convert them with 'engine.fees_preprocessing(api_key, courses)'")
+
+    return changed_courses
+
+def load_extraction_manifest():
+    '''
+    Load the extraction manifest, a dictionary that for every extracted course stores the hash of its page and the version
+    of the extractor. Returns an empty dictionary if nothing has been extracted yet.
+    '''
+
+    if not os.path.exists(extraction_manifest_path):
+        return {}
+
+    with open(extraction_manifest_path, 'r', encoding = "utf-8") as file:
+        return json.load(file)
+
+def save_extraction_manifest(manifest):
+    '''
+    Save the extraction manifest, first under a temporary name and then renamed, so it is never left truncated.
+    '''
+
+    tmp_path = extraction_manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding = "utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, extraction_manifest_path)
+
+def page_hash(html_content):
+    '''
+    Hash of the content of a page, None for a missing page.
+    '''
+
+    if html_content is None:
+        return None
+
+    return hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+
+def _read_page(course, page_archive = None):
+    # the page of a course from the archive or from its .html file, None if it has not been downloaded
+    if page_archive is not None:
+        return page_archive.read(course)
+
+    i = course - 1
+    course_file_path = courses_pages_path + "page_" + str(1 + i // courses_per_page) + "/" + "course_" + str(1 + i % courses_per_page) + ".html"
+    if not os.path.exists(course_file_path):
+        return None
+
+    with open(course_file_path, 'r', encoding = "utf-8") as html_file:
+        return html_file.read()
+
+def _extract_courses(jobs, use_archive, backend = "html.parser", progress = False):
+    '''
+    Extract the informations of the (course number, url) pairs in 'jobs' and write their .tsv files.
+    Returns the entries of the extraction manifest of the extracted courses, and the list of the courses whose fees
+    changed (see 'write_tsv').
+    '''
+
+    extract = fast_extract_fields if backend == "lxml" else extract_fields
+
+    entries = {}
+    changed_fees = []
+    with open_archive(use_archive, read_only = True) as page_archive:
+        for course, url in tqdm(jobs) if progress else jobs:
+
+            # open and read .html file
+            html_content = _read_page(course, page_archive)
+            if html_content is None:
+                raise FileNotFoundError("The page of course " + str(course) + " has not been downloaded")
+
+            if write_tsv(course, url, extract(html_content)):
+                changed_fees.append(course)
+            entries[str(course)] = {"hash": page_hash(html_content), "version": extractor_version}
+
+    return entries, changed_fees
+
+def write_tsv(course, url, fields):
+    '''
+    Write the .tsv file of a course from the 12 extracted fields and its url.
+    When the existing file of the course has the converted fee added by 'engine.fees_preprocessing', it is kept if the
+    fees did not change. Returns True if the fees changed instead, so the converted fee has to be computed again.
+    '''
+
+    courseName, universityName, facultyName, isItFullTime, description, startDate, fees, modality, duration, city, country, administration = fields
+
+    data = [["courseName", "universityName", "facultyName", "isItFullTime", "description", "startDate", "fees", "modality", "duration", "city", "country", "administration", "url"],
+            [courseName, universityName, facultyName, isItFullTime, description, startDate, fees, modality, duration, city, country, administration, url]]
+
+    tsv_file_path = tsvs_path + "course_" + str(course) + ".tsv"
+    old_row = corpus.read_tsv(course) if os.path.exists(tsv_file_path) else {}
+    changed_fees = False
+    if "fees (EUR)" in old_row:
+        if old_row.get("fees") == fees:
+            # in the eighth position, as 'engine.fees_preprocessing' adds it
+            data[0].insert(7, "fees (EUR)")
+            data[1].insert(7, old_row["fees (EUR)"])
+        else:
+            changed_fees = True
+
+    with open(tsv_file_path, 'w+', newline='') as tsv_file:
+        writer = csv.writer(tsv_file, delimiter = '\t', lineterminator = '\n')
+        writer.writerows(data)
+
+    return changed_fees
+
+def extract_fields(html_content):
+    '''
+    Extract from the html page of a course the 12 fields stored in its .tsv file (all the fields but the url).
+    '''
+
+    soup = BeautifulSoup(html_content, "html.parser")
+
+    # if the page is no avaiable we can't get informations
+    if soup.title.text == r"FindAMasters | 500 Error : Internal Server Error":
+        courseName = universityName = facultyName = isItFullTime = description = startDate = fees = modality = duration = city = country = administration = ""
+
+    else:
+        # get all the required fields
+
+        courseName = soup.find("h1", {"class": "course-header__course-title"}).get_text(strip = True, separator = " ")
+        universityName = soup.find("a", {"class": "course-header__institution"}).get_text(strip = True, separator = " ")
+        facultyName = soup.find("a", {"class": "course-header__department"}).get_text(strip = True, separator = " ")
+
+        # some entries do not have this field
+        extract = soup.find("span", {"class": "key-info__study-type"})
+        if extract is None:
+            isItFullTime = ""
+        else:
+            isItFullTime = extract.get_text(strip = True, separator = " ")
+
+        description = soup.find("div", {"class": "course-sections__description"}).find("div", {"class": "course-sections__content"}).get_text(strip = True, separator = " ")
+        startDate = soup.find("span", {"class": "key-info__start-date"}).get_text(strip = True, separator = " ")
+
+        # some entries do not have this field
+        extract = soup.find("div", {"class": "course-sections__fees"})
+        if extract is None:
+            fees = ""
+        else:
+            fees = extract.find("div", {"class": "course-sections__content"}).get_text(strip = True, separator = " ")
+
+        modality = soup.find("span", {"class": "key-info__qualification"}).get_text(strip = True, separator = " ")
+        duration = soup.find("span", {"class": "key-info__duration"}).get_text(strip = True, separator = " ")
+        city = soup.find("a", {"class": "course-data__city"}).get_text(strip = True, separator = " ")
+        country = soup.find("a", {"class": "course-data__country"}).get_text(strip = True, separator = " ")
+
+        # courses can be 'on_campus', 'online' or both, but this information is stored in different tags
+        extract1 = soup.find("a", {"class": "course-data__online"})
+        extract2 = soup.find("a", {"class": "course-data__on-campus"})
+        if extract1 is None and extract2 is None:
+            administration = ""
+        elif extract2 is None:
+            administration = extract1.get_text(strip = True, separator = " ")
+        elif extract1 is None:
+            administration = extract2.get_text(strip = True, separator = " ")
+        else:
+            administration = extract1.get_text(strip = True, separator = " ") + " & " + extract2.get_text(strip = True, separator = " ")
+
+    return [courseName, universityName, facultyName, isItFullTime, description, startDate, fees, modality, duration, city, country, administration]
+
+# classes of the elements containing the fields, all inside the course header, key-info, course-data and course-sections blocks
+fields_classes = {"course-header__course-title": "h1", "course-header__institution": "a", "course-header__department": "a",
+                  "key-info__study-type": "span", "key-info__start-date": "span", "key-info__qualification": "span", "key-info__duration": "span",
+                  "course-data__city": "a", "course-data__country": "a", "course-data__online": "a", "course-data__on-campus": "a",
+                  "course-sections__description": "div", "course-sections__fees": "div"}
+
+# a single query returning, in document order, only the elements of those four blocks
+fields_xpath = lxml.etree.XPath("//*[contains(@class, 'course-header__') or contains(@class, 'key-info__') or "
+                                "contains(@class, 'course-data__') or contains(@class, 'course-sections__')]")
+
+def _get_text(element):
+    # same result of BeautifulSoup 'get_text(strip = True, separator = " ")', comments, scripts and styles are not text
+    strings = element.xpath(".//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]")
+    return " ".join(string.strip() for string in strings if string.strip())
+
+def _find_content(element):
+    for child in element.iter():
+        if child is not element and child.tag == "div" and "course-sections__content" in child.get("class", "").split():
+            return child
+    return None
+
+def fast_extract_fields(html_content):
+    '''
+    Faster version of 'extract_fields' that gives the same fields. The page is parsed by lxml and, instead of looking
+    for every field separately in the whole page, a single query collects the elements of the blocks containing the fields
+    (course header, key-info, course-data and course-sections); for every class we keep the first element with the right tag,
+    as BeautifulSoup 'find' does.
+    '''
+
+    tree = lxml.html.document_fromstring(html_content.encode("utf-8"), parser = lxml.html.HTMLParser(encoding = "utf-8"))
+
+    # if the page is no avaiable we can't get informations
+    title = tree.find(".//title")
+    if title is not None and "".join(title.itertext()) == r"FindAMasters | 500 Error : Internal Server Error":
+        return [""] * 12
+
+    found = {}
+    for element in fields_xpath(tree):
+        for class_name in element.get("class", "").split():
+            if fields_classes.get(class_name) == element.tag and class_name not in found:
+                found[class_name] = element
+
+    def text(class_name):
+        return _get_text(found[class_name]) if class_name in found else ""
+
+    description = _get_text(_find_content(found["course-sections__description"]))
+
+    # some entries do not have this field
+    fees = ""
+    if "course-sections__fees" in found:
+        fees = _get_text(_find_content(found["course-sections__fees"]))
+
+    # courses can be 'on_campus', 'online' or both, but this information is stored in different tags
+    administration = " & ".join(text(class_name) for class_name in ("course-data__online", "course-data__on-campus") if class_name in found)
+
+    return [text("course-header__course-title"), text("course-header__institution"), text("course-header__department"),
+            text("key-info__study-type"), description, text("key-info__start-date"), fees, text("key-info__qualification"),
+            text("key-info__duration"), text("course-data__city"), text("course-data__country"), administration]
+
+def compare_extractors(sample_size = 100, use_archive = use_page_archive, seed = 0):
+    '''
+    Check that 'fast_extract_fields' gives the same fields of 'extract_fields' on a random sample of the downloaded pages.
+    Prints the number of pages with different fields and returns the list of the differences as (course number, field, value
+    of the original extractor, value of the fast extractor).
+    '''
+
+    fields_names = ["courseName", "universityName", "facultyName", "isItFullTime", "description", "startDate", "fees", "modality", "duration", "city", "country", "administration"]
+    courses = random.Random(seed).sample(range(1, n_courses + 1), min(sample_size, n_courses))
+
+    differences = []
+    with open_archive(use_archive, read_only = True) as page_archive:
+        for course in tqdm(courses):
+            html_content = _read_page(course, page_archive)
+
+            for name, original, fast in zip(fields_names, extract_fields(html_content), fast_extract_fields(html_content)):
+                if original != fast:
+                    differences.append((course, name, original, fast))
+
+    print(len(set(course for course, _, _, _ in differences)), "of", len(courses), "pages have different fields between the two extractors.")
+    return differences
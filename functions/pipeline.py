@@ -0,0 +1,169 @@
+'''
+This module contains the streaming version of the first part of the notebook. Instead of running one pass over the disk
+for every stage (crawl_pages, html_extraction, create_vocabulary, create_inverted_index, create_inverted_index_tfidf) the
+stages are chained generators: every page flows from the crawler to the extractor and to the text preprocessing as soon as
+it is downloaded, so extraction and indexing overlap with the network latency of the crawl. Pages, .tsv files and manifests
+are still written along the way, as checkpoints from which the batch functions and a new run can restart.
+'''
+
+# import config
+from functions.config import *
+from functions import crawler
+from functions import parser
+from functions import engine
+from functions import corpus
+from functions.archive import open_archive
+
+# import libraries
+import os
+import queue
+import threading
+
+# the manifests are saved every 'checkpoint_every' pages
+checkpoint_every = 100
+
+class _CrawlStopped(Exception):
+    pass
+
+def run_pipeline(use_archive = use_page_archive, backend = "lxml", connections = n_connections, rate = requests_per_second, max_retries = 5, backoff_time = 2, queue_size = 64):
+    '''
+    Crawl the missing pages, extract all the courses and create vocabulary, inverted index and inverted index tfidf in a
+    single streaming pass. The results are the same files written by the batch functions, with the same term ids and scores.
+    Pages already downloaded and courses already extracted (according to the extraction manifest) are not repeated.
+    '''
+
+    # the corpus store needs all the courses, a short list of urls is found before crawling
+    with open(courses_urls_path, 'r') as courses_file:
+        n_urls = sum(1 for _ in courses_file)
+    if n_urls < n_courses:
+        raise ValueError("The courses from " + str(n_urls + 1) + " to " + str(n_courses) + " are missing from " + courses_urls_path + ", collect their urls first")
+
+    rows = {}
+    documents = {}
+
+    pages = stream_pages(use_archive, connections, rate, max_retries, backoff_time, queue_size)
+    for course, row in extract_pages(pages, backend):
+        rows[course] = row
+
+        # preprocess the description as soon as the course is available
+        if row["description"]:
+            documents[course] = engine.analyzer.analyze(row["description"])
+
+    corpus.build_corpus_store([rows[i] for i in range(1, n_courses + 1)])
+    engine.create_indexes(documents = [(course, documents[course]) for course in sorted(documents)])
+
+def stream_pages(use_archive = use_page_archive, connections = n_connections, rate = requests_per_second, max_retries = 5, backoff_time = 2, queue_size = 64):
+    '''
+    Yield a (course number, url, html) triple for every course. The pages already downloaded are read from the disk while
+    the missing ones are downloaded in a background thread by the asynchronous crawler; a downloaded page is saved (in its
+    .html file or in the archive) and immediately passed on. At most 'queue_size' pages wait to be consumed, so a slow
+    consumer slows down the crawler instead of filling the memory.
+    '''
+
+    with open(courses_urls_path, 'r') as courses_file:
+        urls = [url.strip('\n') for url in courses_file]
+
+    manifest = crawler.load_crawl_manifest()
+    downloaded = queue.Queue(queue_size)
+    stop = threading.Event()
+    stored = 0
+
+    with open_archive(use_archive) as page_archive:
+        jobs = [(1 + i, url, {}) for i, url in enumerate(urls) if not crawler._page_exists(1 + i, page_archive)]
+        missing = set(course for course, _, _ in jobs)
+
+        def put(item):
+            # wait for free space in the queue, unless the consumer has stopped
+            while not stop.is_set():
+                try:
+                    downloaded.put(item, timeout = 1)
+                    return
+                except queue.Full:
+                    pass
+            raise _CrawlStopped()
+
+        def on_page(course, response, soup):
+            nonlocal stored
+            html = str(soup)
+            crawler._store_page(manifest, urls[course - 1], course, response.headers, html, page_archive)
+            stored += 1
+            if stored % checkpoint_every == 0:
+                crawler.save_crawl_manifest(manifest)
+            put((course, html))
+
+        def crawl():
+            try:
+                if len(jobs) > 0:
+                    crawler._run_async(crawler._async_crawl(jobs, crawler._is_block_page, on_page, connections, rate, max_retries, backoff_time))
+                put(None)
+            except _CrawlStopped:
+                pass
+            except Exception as error: # given to the consumer, that raises it
+                try:
+                    put(error)
+                except _CrawlStopped:
+                    pass
+
+        thread = threading.Thread(target = crawl, daemon = True)
+        thread.start()
+
+        try:
+            # the pages already on the disk go first, while the missing ones are being downloaded
+            with open_archive(use_archive, read_only = True) as archive_reader:
+                for course in range(1, len(urls) + 1):
+                    if course not in missing:
+                        yield course, urls[course - 1], parser._read_page(course, archive_reader)
+
+            while True:
+                item = downloaded.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                course, html = item
+                yield course, urls[course - 1], html
+
+        finally:
+            stop.set()
+            thread.join()
+            crawler.save_crawl_manifest(manifest)
+
+def extract_pages(pages, backend = "lxml"):
+    '''
+    Yield a (course number, row) pair for every (course number, url, html) triple in 'pages', where the row is the content
+    of the .tsv file of the course as a dictionary. A course is extracted and its .tsv file written only if the extraction
+    manifest says that it is missing or outdated, otherwise the existing .tsv file is read.
+    '''
+
+    extract = parser.fast_extract_fields if backend == "lxml" else parser.extract_fields
+
+    if not os.path.exists(tsvs_path):
+        os.makedirs(tsvs_path)
+
+    manifest = parser.load_extraction_manifest()
+    extracted = 0
+
+    try:
+        for course, url, html_content in pages:
+            html_hash = parser.page_hash(html_content)
+            entry = manifest.get(str(course))
+            tsv_file_path = tsvs_path + "course_" + str(course) + ".tsv"
+
+            if entry is None or not os.path.exists(tsv_file_path) or entry["version"] != parser.extractor_version or entry["hash"] != html_hash:
+                if html_content is None:
+                    raise FileNotFoundError("The page of course " + str(course) + " has not been downloaded")
+
+                if parser.write_tsv(course, url, extract(html_content)):
+                    print("The fees of course " + str(course) + " changed, convert them with 'engine.fees_preprocessing(api_key, courses)'")
+                manifest[str(course)] = {"hash": html_hash, "version": parser.extractor_version}
+
+                extracted += 1
+                if extracted % checkpoint_every == 0:
+                    parser.save_extraction_manifest(manifest)
+
+            yield course, corpus.read_tsv(course)
+
+    finally:
+        if extracted > 0:
+            parser.save_extraction_manifest(manifest)
@@ -0,0 +1,239 @@
+'''
+This module contains the optional positional index: for every term and every document containing it, the positions of
+the term among the preprocessed words of the document (the words given by 'engine.analyzer', so without the stopwords).
+With it, phrase queries ('phrase_match') and queries whose words must appear close to each other, in the order of the
+query or in any order ('proximity_match'), are answered by merging lists of positions instead of reading and
+preprocessing again the descriptions of the candidates.
+The index is a single file opened with mmap, as the ones of 'binary_index.py': a table with the number of documents of
+every term id, the doc ids of all the lists, and the positions of every (term, document) pair compressed as differences
+between consecutive positions written in variable length (see 'binary_index.encode_doc_ids'). The doc ids are the same
+of the inverted index, so the positional index can also take its place in 'engine.intersect_postings'.
+'''
+
+# import config
+from functions.config import *
+from functions import engine
+from functions import binary_index
+
+# import libraries
+import numpy as np
+from array import array
+
+# first bytes of the file, followed by the version of the format and the number of term ids
+positional_magic = b"ADMX"
+
+class PositionalIndex(binary_index._MappedFile):
+    '''
+    Positional index opened from its file. As a dictionary term id -> array of doc ids it works as an inverted index,
+    and 'positions' gives the positions of a term in a document.
+    '''
+
+    def __init__(self, file_path = positional_index_path):
+        super().__init__(file_path, positional_magic)
+
+        # the documents of term id t are the ones from counts[t] to counts[t + 1], and the positions of the i-th document
+        # of all the lists are encoded in the bytes from offsets[i] to offsets[i + 1]
+        n = self.size
+        self.counts = self._array("<u8", n + 1, binary_index.header.size)
+        total = int(self.counts[-1])
+        self.doc_ids = self._array("<u4", total, binary_index.header.size + 8 * (n + 1))
+        self.offsets = self._array("<u8", total + 1, binary_index.header.size + 8 * (n + 1) + 4 * total)
+        self.positions_start = binary_index.header.size + 8 * (n + 1) + 4 * total + 8 * (total + 1)
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.counts)))
+
+    def __contains__(self, term_id):
+        return 0 <= term_id < self.size and self.counts[term_id + 1] > self.counts[term_id]
+
+    def document_frequency(self, term_id):
+        '''
+        Number of documents of a term, read from the table.
+        '''
+
+        return int(self.counts[term_id + 1] - self.counts[term_id]) if term_id in self else 0
+
+    def docs(self, term_id):
+        '''
+        Return the doc ids of a term as a numpy array (empty if the term is not in the index).
+        '''
+
+        if term_id not in self:
+            return self.doc_ids[:0]
+        return self.doc_ids[int(self.counts[term_id]):int(self.counts[term_id + 1])]
+
+    def positions(self, term_id, doc_id):
+        '''
+        Return the sorted positions of a term in a document as a numpy array (empty if the term is not in the document).
+        '''
+
+        docs = self.docs(term_id)
+        i = int(np.searchsorted(docs, doc_id))
+        if i == len(docs) or docs[i] != doc_id:
+            return np.zeros(0, dtype = np.uint32)
+
+        i += int(self.counts[term_id])
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return binary_index.decode_doc_ids(self._array(np.uint8, end - start, self.positions_start + start))
+
+    def __getitem__(self, term_id):
+        if term_id not in self:
+            raise KeyError(term_id)
+        return binary_index._to_array('I', self.docs(term_id))
+
+    def get(self, term_id, default = None):
+        return self[term_id] if term_id in self else default
+
+    def __iter__(self):
+        return (term_id for term_id in range(self.size) if term_id in self)
+
+    def keys(self):
+        return iter(self)
+
+def build_positional_index(documents, vocabulary):
+    '''
+    Build the positional index of the (doc id, words) pairs in 'documents', given in order of doc id, as the dictionary
+    term id -> (array of doc ids, list of arrays of positions). The term ids are the ones of 'vocabulary'.
+    '''
+
+    positional_index = {}
+    for doc_id, words in documents:
+        doc_positions = {}
+        for position, w in enumerate(words):
+            doc_positions.setdefault(vocabulary[w], array('I')).append(position)
+
+        for term_id, positions in doc_positions.items():
+            docs, term_positions = positional_index.setdefault(term_id, (array('I'), []))
+            docs.append(doc_id)
+            term_positions.append(positions)
+
+    return positional_index
+
+def write_positional_index(positional_index, file_path = positional_index_path):
+    '''
+    Write a positional index built by 'build_positional_index' in its binary file.
+    '''
+
+    size = max(positional_index.keys(), default = -1) + 1
+    counts = np.zeros(size + 1, dtype = "<u8")
+    doc_ids = []
+    lengths = []
+    deltas = []
+    for term_id in sorted(positional_index):
+        docs, term_positions = positional_index[term_id]
+        counts[term_id + 1] = len(docs)
+        doc_ids.append(np.asarray(docs, dtype = "<u4"))
+        for positions in term_positions:
+            positions = np.asarray(positions, dtype = np.uint64)
+            lengths.append(len(positions))
+            deltas.append(np.diff(positions, prepend = np.uint64(0)))
+    counts = np.cumsum(counts, dtype = "<u8")
+
+    # all the lists of positions are encoded together: 'encode_doc_ids' writes the differences of its input, so it is
+    # given the running sum of the differences inside every list
+    deltas = np.concatenate(deltas) if len(deltas) > 0 else np.zeros(0, dtype = np.uint64)
+    encoded = binary_index.encode_doc_ids(np.cumsum(deltas, dtype = np.uint64))
+
+    # byte where every list starts: the first byte of its first value
+    ends = (encoded & 0x80) == 0
+    value_starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    first_values = np.cumsum(lengths, dtype = np.int64) - np.asarray(lengths, dtype = np.int64)
+    offsets = np.append(value_starts[first_values] if len(encoded) > 0 else np.zeros(len(lengths), dtype = np.int64), len(encoded)).astype("<u8")
+
+    with binary_index._atomic_file(file_path) as file:
+        file.write(binary_index.header.pack(positional_magic, binary_index.format_version, size))
+        file.write(counts.tobytes())
+        file.write(b"".join(docs.tobytes() for docs in doc_ids))
+        file.write(offsets.tobytes())
+        file.write(encoded.tobytes())
+
+def create_indexes(field = "description", file_paths = None, positional_path = positional_index_path):
+    '''
+    Create vocabulary, inverted index and inverted index tfidf as 'engine.create_indexes', together with the positional
+    index with the same term ids, preprocessing every course only once.
+    '''
+
+    if file_paths is None:
+        file_paths = (vocabulary_file_path, inv_index_file_path, inv_ind_tfidf_file_path)
+
+    documents = list(engine.analyze_field(field))
+    indexes = engine.build_indexes(documents)
+    for index, file_path in zip(indexes, file_paths):
+        engine.save_index(index, file_path)
+
+    write_positional_index(build_positional_index(documents, indexes[0]), positional_path)
+
+    print("Vocabulary, inverted index, inverted index TF-IDF and positional index successfully created!")
+
+def open_positional_index(file_path = positional_index_path):
+    '''
+    Open the positional index written by 'create_indexes' or 'write_positional_index'.
+    '''
+
+    return PositionalIndex(file_path)
+
+def phrase_match(query_words, vocabulary, positional_index):
+    '''
+    Return the sorted doc ids of the documents containing the (preprocessed) words of the query one right after the
+    other, in the order of the query.
+    '''
+
+    return proximity_match(query_words, vocabulary, positional_index, len(query_words), in_order = True)
+
+def proximity_match(query_words, vocabulary, positional_index, window, in_order = False):
+    '''
+    Return the sorted doc ids of the documents where all the (preprocessed) words of the query appear inside 'window'
+    consecutive words. With 'in_order' the words must also appear in the order of the query, every one after the previous
+    (a repeated word must then appear again), otherwise in any order.
+    The candidates are the documents containing all the words, as in 'engine.intersect_postings'; the positions are read
+    only for them.
+    '''
+
+    result = array('I')
+    if len(query_words) == 0:
+        return result
+
+    term_ids = [vocabulary.get(w) for w in query_words]
+    if not in_order:
+        term_ids = list(dict.fromkeys(term_ids))
+
+    for doc_id in engine.intersect_postings(query_words, vocabulary, positional_index):
+        positions = [positional_index.positions(term_id, doc_id).astype(np.int64) for term_id in term_ids]
+        if in_order:
+            span = _ordered_span(positions)
+        else:
+            span = _unordered_span(positions)
+        if span <= window:
+            result.append(doc_id)
+
+    return result
+
+def _ordered_span(positions):
+    # shortest span containing the words in order: from every position of the first word, the next position of every
+    # following word is taken as soon as possible
+    starts = positions[0]
+    ends = starts
+    found = np.ones(len(starts), dtype = bool)
+    for word_positions in positions[1:]:
+        following = np.searchsorted(word_positions, ends, side = 'right')
+        found &= following < len(word_positions)
+        ends = word_positions[np.minimum(following, len(word_positions) - 1)]
+
+    if not found.any():
+        return np.inf
+    return int(np.min(ends[found] - starts[found])) + 1
+
+def _unordered_span(positions):
+    # shortest span containing all the words: it starts at a position of one of them and ends at the farthest of the
+    # next positions of the words from there
+    starts = np.unique(np.concatenate(positions))
+    ends = starts
+    found = np.ones(len(starts), dtype = bool)
+    for word_positions in positions:
+        following = np.searchsorted(word_positions, starts, side = 'left')
+        found &= following < len(word_positions)
+        ends = np.maximum(ends, word_positions[np.minimum(following, len(word_positions) - 1)])
+
+    if not found.any():
+        return np.inf
+    return int(np.min(ends[found] - starts[found])) + 1
@@ -0,0 +1,239 @@
+'''
+This module contains the record/replay layer used to work offline on the parts of the project that talk to external services:
+the crawler (findamasters.com), the currency conversion of the fees (open.er-api.com) and the geocoding of the universities (Bing).
+Every service is reached through the base url stored in 'service_urls' (functions/config.py). A ReplayServer is a local
+stand-in for one service: in "record" mode it forwards the requests to the real service and stores every answer in a cassette,
+in "replay" mode it answers only from the cassettes, optionally adding latency and injecting errors.
+'''
+
+# import config
+from functions.config import *
+
+# import libraries
+import os
+import json
+import time
+import random
+import base64
+import hashlib
+import threading
+import contextlib
+import urllib.request
+import urllib.error
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# original addresses of the services, used to translate the urls when a service is redirected to a local server
+live_service_urls = dict(service_urls)
+
+# query parameters containing api keys are never stored in the cassettes
+secret_parameters = {"apikey", "api_key", "key"}
+
+def resolve(url):
+    '''
+    Translate the url of a live service to the address currently configured for that service in 'service_urls'.
+    Urls of other hosts are returned unchanged.
+    '''
+
+    for service, live_url in live_service_urls.items():
+        if url.startswith(live_url) and service_urls[service] != live_url:
+            return service_urls[service] + url[len(live_url):]
+
+    return url
+
+def cassette_key(method, path):
+    '''
+    Key identifying a request in the cassettes: method, path and sorted query parameters without the api keys.
+    '''
+
+    parts = urlsplit(path)
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values = True) if name.lower() not in secret_parameters)
+
+    return method + " " + parts.path + ("?" + urlencode(query) if query else "")
+
+class CassetteStore:
+    '''
+    Folder containing the recorded answers of a service, one .json file for every request.
+    '''
+
+    def __init__(self, service, path = cassettes_path):
+        self.folder = os.path.join(path, service)
+        os.makedirs(self.folder, exist_ok = True)
+
+    def _file_path(self, key):
+        return os.path.join(self.folder, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def __contains__(self, key):
+        return os.path.exists(self._file_path(key))
+
+    def load(self, key):
+        '''
+        Return the (status, headers, body) of a recorded answer, None if the request has never been recorded.
+        '''
+
+        if key not in self:
+            return None
+
+        with open(self._file_path(key), 'r', encoding = "utf-8") as file:
+            cassette = json.load(file)
+
+        return cassette["status"], cassette["headers"], base64.b64decode(cassette["body"])
+
+    def save(self, key, status, headers, body):
+        cassette = {"request": key, "status": status, "headers": headers, "body": base64.b64encode(body).decode("ascii")}
+
+        tmp_path = self._file_path(key) + ".tmp"
+        with open(tmp_path, 'w', encoding = "utf-8") as file:
+            json.dump(cassette, file)
+        os.replace(tmp_path, self._file_path(key))
+
+class ReplayServer:
+    '''
+    Local HTTP server standing in for one of the services in 'service_urls'. While the server is running the service is
+    redirected to it, so all the functions of the project use it without changes.
+    - mode "record": requests missing from the cassettes are forwarded to the real service and their answers are stored
+    - mode "replay": requests are answered only from the cassettes, missing ones get a 404
+    'latency' is the idle time in seconds added to every answer, either a number or a (min, max) range.
+    'error_rate' is the fraction of requests answered with 'error_status' instead of the recorded answer.
+    Conditional requests (If-None-Match, If-Modified-Since) are answered with "304 Not Modified" when they match the cassette.
+    '''
+
+    def __init__(self, service, mode = "replay", latency = 0, error_rate = 0, error_status = 503, store_path = cassettes_path, seed = None):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay'")
+
+        self.service = service
+        self.mode = mode
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.store = CassetteStore(service, store_path)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0, "errors": 0}
+        self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        '''
+        Start the server on a free local port and redirect the service to it. Returns the base url of the server.
+        '''
+
+        replay_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                replay_server._handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+        self.url = "http://127.0.0.1:" + str(self.server.server_address[1])
+        service_urls[self.service] = self.url
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        service_urls[self.service] = live_service_urls[self.service]
+
+    def _count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def _handle(self, request):
+        # simulate the network
+        if isinstance(self.latency, tuple):
+            time.sleep(self.random.uniform(*self.latency))
+        elif self.latency > 0:
+            time.sleep(self.latency)
+
+        with self.lock:
+            inject_error = self.random.random() < self.error_rate
+        if inject_error:
+            self._count("errors")
+            self._send(request, self.error_status, {"Content-Type": "text/plain"}, b"Injected error")
+            return
+
+        key = cassette_key(request.command, request.path)
+        cassette = self.store.load(key)
+
+        if cassette is None and self.mode == "record":
+            cassette = self._forward(request)
+            self.store.save(key, *cassette)
+            self._count("recorded")
+        elif cassette is None:
+            self._count("misses")
+            self._send(request, 404, {"Content-Type": "text/plain"}, b"Request not recorded: " + key.encode("utf-8"))
+            return
+        else:
+            self._count("hits")
+
+        status, headers, body = cassette
+        if status == 200 and self._not_modified(request, headers):
+            self._send(request, 304, {name: value for name, value in headers.items() if name in ("ETag", "Last-Modified")}, b"")
+        else:
+            self._send(request, status, headers, body)
+
+    def _not_modified(self, request, headers):
+        if request.headers.get("If-None-Match") is not None:
+            return request.headers.get("If-None-Match") == headers.get("ETag")
+        if request.headers.get("If-Modified-Since") is not None:
+            return request.headers.get("If-Modified-Since") == headers.get("Last-Modified")
+        return False
+
+    def _forward(self, request):
+        '''
+        Send the request to the real service and return its (status, headers, body). Conditional and encoding headers are
+        not forwarded, so the cassette always stores the complete and uncompressed answer.
+        '''
+
+        skipped_headers = {"host", "accept-encoding", "connection", "if-none-match", "if-modified-since"}
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in skipped_headers}
+        upstream = urllib.request.Request(live_service_urls[self.service] + request.path, headers = headers)
+
+        try:
+            with urllib.request.urlopen(upstream) as response:
+                status, response_headers, body = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error: # error pages are recorded too
+            status, response_headers, body = error.code, error.headers, error.read()
+
+        kept_headers = {name: response_headers[name] for name in ("Content-Type", "ETag", "Last-Modified") if response_headers.get(name) is not None}
+        return status, kept_headers, body
+
+    def _send(self, request, status, headers, body):
+        request.send_response(status)
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        if status != 304:
+            request.wfile.write(body)
+
+@contextlib.contextmanager
+def replay_services(mode = "replay", services = None, **options):
+    '''
+    Start a ReplayServer for every service (or only for the ones listed in 'services') and redirect them for the duration
+    of the 'with' block. The servers are given back as a dictionary, to read their statistics.
+    '''
+
+    servers = {service: ReplayServer(service, mode, **options) for service in (services or live_service_urls)}
+    try:
+        for server in servers.values():
+            server.start()
+        yield servers
+    finally:
+        for server in servers.values():
+            server.stop()
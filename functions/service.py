@@ -0,0 +1,194 @@
+'''
+This module contains a local HTTP search service. The indexes are loaded once, with their forward indexes (see
+'engine.ForwardIndex'), then the service answers the queries with the functions of the notebook, as JSON endpoints:
+- /search: 'engine.search_engine', parameters 'query' and 'all_rows'
+- /top_k: 'engine.top_k_documents', parameters 'query' and 'k' (a number or "all")
+- /scoring: 'new_scoring.scoring_function', parameters 'query', 'k' and 'all_columns'
+- /bonus: 'bonus.bonus_search_engine', parameters the keys of its input dictionary (the missing ones are not used)
+- /stats: hits, misses and size of the cache of the query results
+The parameters are read from the query string or from a JSON body, and the result is the list of the rows of the
+dataframe. Every worker process runs its own asyncio event loop on the same listening socket, and the queries are
+evaluated in a thread pool so that the loop keeps accepting requests (and answering /stats) while a long query runs;
+the queries of a worker still share its interpreter, the workers are what runs them on many cores. The workers are forked
+after the indexes are loaded, so they all read the same copy of them (shared by the operating system until written,
+and never written by the queries) instead of loading one copy each; the binary indexes (see 'binary_index.py') are
+shared through the memory map.
+Run it with 'python -m functions.service' from the folder of the notebook.
+'''
+
+# import config
+from functions.config import *
+from functions import engine
+from functions import new_scoring
+from functions import bonus
+from functions import cache
+from functions import binary_index
+
+# import libraries
+import os
+import gc
+import asyncio
+import signal
+import socket
+import argparse
+from aiohttp import web
+
+# indexes of the questions 2 and 3, loaded by 'load_engine'
+_indexes = None
+
+# input of 'bonus.bonus_search_engine' when a parameter is not given
+bonus_defaults = {"description_query": "", "advanced_search_engine": False, "course_name_query": "", "university_name_query": "", "university_city_query": "",
+                  "use_fee_filter": False, "min_fee": 0, "max_fee": float("inf"), "use_country_filter": False, "country_list": [], "use_start_filter": False, "use_online_filter": False}
+
+class _ParameterError(Exception):
+    pass
+
+def load_engine(text_paths = None, binary_folder = None):
+    '''
+    Load the indexes of the questions 2 and 3, from the text files in 'text_paths' (by default the ones in the config
+    file) or from the binary files in 'binary_folder', and the indexes of all the types of search of question 5, so they
+    are shared by the workers too.
+    '''
+
+    global _indexes
+
+    if binary_folder is not None:
+        _indexes = binary_index.open_binary_index(binary_folder)
+    else:
+        _indexes = engine.load_indexes(text_paths)
+
+    for t in bonus.field_columns:
+        bonus.load_indexes(t)
+
+def search(parameters):
+    vocabulary, inverted_index, _ = _indexes
+    return engine.search_engine(_required(parameters, "query"), vocabulary, inverted_index, all_rows = _boolean(parameters.get("all_rows", False)))
+
+def top_k(parameters):
+    vocabulary, inverted_index, inverted_index_tfidf = _indexes
+    return engine.top_k_documents(_required(parameters, "query"), vocabulary, inverted_index, inverted_index_tfidf, k = _k(parameters.get("k", 5)))
+
+def scoring(parameters):
+    vocabulary, inverted_index, inverted_index_tfidf = _indexes
+    return new_scoring.scoring_function(_required(parameters, "query"), vocabulary, inverted_index, inverted_index_tfidf, k = int(parameters.get("k", 5)), all_columns = _boolean(parameters.get("all_columns", False)))
+
+def bonus_search(parameters):
+    input_dict = dict(bonus_defaults)
+    for key, value in parameters.items():
+        if key not in bonus_defaults:
+            raise _ParameterError("unknown parameter '" + key + "'")
+        # the values of the query string are all strings
+        if isinstance(bonus_defaults[key], bool):
+            value = _boolean(value)
+        elif isinstance(bonus_defaults[key], (int, float)):
+            value = float(value)
+        elif isinstance(bonus_defaults[key], list) and isinstance(value, str):
+            value = value.split(",")
+        input_dict[key] = value
+    return bonus.bonus_search_engine(input_dict)
+
+def _required(parameters, name):
+    if name not in parameters:
+        raise _ParameterError("missing parameter '" + name + "'")
+    return parameters[name]
+
+def _boolean(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+def _k(value):
+    return "all" if value == "all" else int(value)
+
+def _endpoint(function):
+    # request handler calling 'function' with the parameters of the request and answering with its dataframe as JSON
+    async def handler(request):
+        try:
+            parameters = dict(request.query)
+            if request.can_read_body:
+                body = await request.json()
+                if not isinstance(body, dict):
+                    raise _ParameterError("the body must be a JSON object")
+                parameters.update(body)
+
+            # the query runs in a thread, the event loop is free in the meantime
+            result = await asyncio.get_running_loop().run_in_executor(None, function, parameters)
+        except _ParameterError as error:
+            return web.json_response({"error": str(error)}, status = 400)
+        except (ValueError, TypeError) as error: # also a body that is not JSON, or a query without any indexed word
+            return web.json_response({"error": str(error)}, status = 400)
+
+        return web.Response(text = "[]" if result is None else result.to_json(orient = "records"), content_type = "application/json")
+
+    return handler
+
+async def stats(request):
+    return web.json_response({"pid": os.getpid(), **cache.result_cache.stats()})
+
+def create_app():
+    '''
+    Return the aiohttp application with the endpoints of the service.
+    '''
+
+    app = web.Application()
+    for path, function in [("/search", search), ("/top_k", top_k), ("/scoring", scoring), ("/bonus", bonus_search)]:
+        app.router.add_route("GET", path, _endpoint(function))
+        app.router.add_route("POST", path, _endpoint(function))
+    app.router.add_get("/stats", stats)
+    return app
+
+def serve(host = service_host, port = service_port, n_workers = service_workers, text_paths = None, binary_folder = None):
+    '''
+    Load the engine and serve the queries on 'host':'port' with 'n_workers' processes, until interrupted.
+    Where processes cannot be forked (on Windows) or with a single worker, the queries are served by this process.
+    '''
+
+    load_engine(text_paths, binary_folder)
+    listening = socket.create_server((host, port))
+    print("Search service listening on http://" + host + ":" + str(port))
+
+    if n_workers <= 1 or not hasattr(os, "fork"):
+        _run_worker(listening)
+        return
+
+    # the loaded objects are moved out of the garbage collector, so that its visits do not write on (and copy) their pages
+    gc.freeze()
+
+    workers = []
+    for _ in range(n_workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(listening)
+            finally:
+                os._exit(0)
+        workers.append(pid)
+
+    try:
+        for pid in workers:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # a second interrupt must not leave the workers running
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        listening.close()
+
+def _run_worker(listening):
+    web.run_app(create_app(), sock = listening, print = None)
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description = "Local HTTP search service")
+    arguments.add_argument("--host", default = service_host)
+    arguments.add_argument("--port", type = int, default = service_port)
+    arguments.add_argument("--workers", type = int, default = service_workers)
+    arguments.add_argument("--binary-folder", default = None, help = "serve the binary indexes in this folder instead of the text files")
+    options = arguments.parse_args()
+
+    serve(options.host, options.port, options.workers, binary_folder = options.binary_folder)
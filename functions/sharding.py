@@ -0,0 +1,199 @@
+'''
+This module contains the sharded version of the indexes of question 2, for corpora too large for a single process. The
+courses are divided in 'n_shards' shards of consecutive doc ids, and every shard has its own inverted index and inverted
+index tfidf (binary files, see 'binary_index.py') with the lists of its documents only. The vocabulary is shared and the
+tf-idf scores are computed with the idf of the whole corpus, so every document has the same scores and the same norm it
+has in the single index: the first k documents of a query are the first k of the union of the first k of every shard,
+and merging them gives exactly the result of 'engine.top_k_documents'.
+The queries are sent to all the shards at the same time, and every shard can be served by its own process, which opens
+only the files of that shard.
+'''
+
+# import config
+from functions.config import *
+from functions import engine
+from functions import corpus
+from functions import binary_index
+
+# import libraries
+import os
+import json
+import heapq
+import concurrent.futures
+import numpy as np
+from array import array
+from sklearn.feature_extraction.text import TfidfVectorizer
+from tqdm.notebook import tqdm
+
+# indexes of the shard opened by a shard process (see '_open_shard')
+_shard = None
+
+def shard_ranges(shards = n_shards):
+    '''
+    Return the (first doc id, last doc id + 1) pair of every shard, dividing the courses in parts of nearly the same size.
+    '''
+
+    bounds = np.linspace(1, n_courses + 1, shards + 1).round().astype(int).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def shard_paths(shard, folder = shards_path):
+    '''
+    Paths of the inverted index and the inverted index tfidf of a shard.
+    '''
+
+    shard_folder = os.path.join(folder, "shard_" + str(shard))
+    return os.path.join(shard_folder, "inverted_index.bin"), os.path.join(shard_folder, "inv_index_tfidf.bin")
+
+def create_shards(shards = n_shards, field = "description", folder = shards_path):
+    '''
+    Create in 'folder' the vocabulary of the whole corpus and, for every shard, the inverted index and the inverted index
+    tfidf of its courses, with the same term ids and scores of 'engine.create_indexes'. The courses are preprocessed one
+    shard at a time, and only the term frequencies are kept until the document frequencies of the whole corpus are known.
+    '''
+
+    print("Creating " + str(shards) + " shards...")
+
+    values = corpus.read_field(field)
+    vocabulary = {}
+    document_frequency = {}
+    # (term ids, doc ids, term frequencies) of every shard, in the order of 'engine.build_indexes'
+    frequencies = []
+
+    for start, end in tqdm(shard_ranges(shards)):
+        t_f = {}
+        for doc_id in range(start, end):
+            if not values[doc_id - 1]:
+                continue
+            for w in engine.analyzer.analyze(values[doc_id - 1]):
+                term_id = vocabulary.get(w)
+                if term_id is None:
+                    term_id = len(vocabulary) + 1
+                    vocabulary[w] = term_id
+                if (term_id, doc_id) not in t_f:
+                    document_frequency[term_id] = document_frequency.get(term_id, 0) + 1
+                t_f[(term_id, doc_id)] = t_f.get((term_id, doc_id), 0) + 1
+
+        keys = np.array(list(t_f), dtype = np.int64).reshape(-1, 2)
+        frequencies.append((keys[:, 0], keys[:, 1], np.fromiter(t_f.values(), dtype = np.int64, count = len(t_f))))
+
+    # idf of every term in the whole corpus, as in 'engine.build_indexes'
+    idf = np.zeros(len(vocabulary) + 1)
+    for term_id, d_f in document_frequency.items():
+        idf[term_id] = np.log(n_courses / (d_f + 1))
+
+    for shard, (term_ids, doc_ids, t_f) in enumerate(frequencies):
+        scores = np.round(t_f * idf[term_ids], 2)
+
+        # the lists of every term, with the documents in increasing order
+        order = np.argsort(term_ids, kind = 'stable')
+        term_ids, doc_ids, scores = term_ids[order], doc_ids[order], scores[order]
+        bounds = np.flatnonzero(np.diff(term_ids)) + 1
+        inverted_index = {}
+        inv_index_tfidf = {}
+        for first, term_docs, term_scores in zip(np.concatenate(([0], bounds)), np.split(doc_ids, bounds), np.split(scores, bounds)):
+            if len(term_docs) == 0:
+                continue
+            term_id = int(term_ids[first])
+            inverted_index[term_id] = binary_index._to_array('I', term_docs)
+            inv_index_tfidf[term_id] = (inverted_index[term_id], binary_index._to_array('d', term_scores))
+
+        inverted_index_path, inverted_index_tfidf_path = shard_paths(shard, folder)
+        binary_index.write_inverted_index(inverted_index, inverted_index_path)
+        binary_index.write_inverted_index(inv_index_tfidf, inverted_index_tfidf_path)
+
+    binary_index.write_vocabulary(vocabulary, os.path.join(folder, "vocabulary.bin"))
+    with open(os.path.join(folder, "shards.json"), 'w') as manifest_file:
+        json.dump({"shards": shard_ranges(shards)}, manifest_file)
+
+    print("Shards successfully created!")
+
+def open_shard(shard, folder = shards_path):
+    '''
+    Open vocabulary, inverted index and inverted index tfidf of a shard.
+    '''
+
+    inverted_index_path, inverted_index_tfidf_path = shard_paths(shard, folder)
+    return (binary_index.BinaryVocabulary(os.path.join(folder, "vocabulary.bin")), binary_index.BinaryInvertedIndex(inverted_index_path), binary_index.BinaryInvertedIndex(inverted_index_tfidf_path))
+
+class ShardedIndex:
+    '''
+    The shards written by 'create_shards', opened for the queries. With 'processes' every shard is opened and searched by
+    its own process, otherwise all the shards are opened by this process. Close it (or use it in a 'with' block) to stop
+    the processes.
+    '''
+
+    def __init__(self, folder = shards_path, processes = True):
+        with open(os.path.join(folder, "shards.json"), 'r') as manifest_file:
+            self.ranges = [tuple(shard_range) for shard_range in json.load(manifest_file)["shards"]]
+
+        self.shards = []
+        self.executors = []
+        if processes:
+            self.executors = [concurrent.futures.ProcessPoolExecutor(1, initializer = _open_shard, initargs = (shard, folder)) for shard in range(len(self.ranges))]
+        else:
+            self.shards = [open_shard(shard, folder) for shard in range(len(self.ranges))]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown()
+        # the arrays read from the files of the shards keep them mapped, they are unmapped when no longer used
+        self.executors = []
+        self.shards = []
+
+    def _scatter(self, function, *args):
+        # call 'function' on every shard at the same time and return the results in order of shard
+        if self.executors:
+            futures = [executor.submit(function, *args) for executor in self.executors]
+            return [future.result() for future in futures]
+        return [function(*args, shard = shard) for shard in self.shards]
+
+    def search_engine(self, query, all_rows = False):
+        '''
+        The same as 'engine.search_engine', on the shards.
+        '''
+
+        query_words = engine.analyzer.analyze(query)
+
+        # the shards have consecutive doc ids, so their results follow one another in order
+        doc = array('I')
+        for shard_doc in self._scatter(_search_shard, query_words):
+            doc.extend(shard_doc)
+        return engine.search_results(doc, all_rows)
+
+    def top_k_documents(self, query, k = 5, pruning = True):
+        '''
+        The same as 'engine.top_k_documents', on the shards: every shard gives its first k documents, sorted, and they are
+        merged keeping the first k.
+        '''
+
+        # vectorize the query as in 'engine.top_k_documents'
+        query_words = engine.preprocess_text(query)
+        vectorizer = TfidfVectorizer()
+        X = vectorizer.fit_transform([query_words])
+        query_vector = X.toarray()[0]
+
+        ranked = list(heapq.merge(*self._scatter(_rank_shard, query_words.split(), query_vector, k, pruning)))
+        if k != "all":
+            ranked = ranked[:k]
+        return engine.top_k_results(ranked, k)
+
+def _open_shard(shard, folder):
+    # run once in the process of a shard
+    global _shard
+    _shard = open_shard(shard, folder)
+
+def _search_shard(query_words, shard = None):
+    vocabulary, inverted_index, _ = _shard if shard is None else shard
+    return engine.intersect_postings(query_words, vocabulary, inverted_index)
+
+def _rank_shard(query_words, query_vector, k, pruning, shard = None):
+    # the first k (-score, doc id) pairs of the shard, sorted
+    vocabulary, inverted_index, inverted_index_tfidf = _shard if shard is None else shard
+    heap = engine.rank_documents(query_words, query_vector, vocabulary, inverted_index, inverted_index_tfidf, k, pruning)
+    return heapq.nsmallest(len(heap) if k == "all" else k, heap)
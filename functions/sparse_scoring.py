@@ -0,0 +1,160 @@
+'''
+This module contains a vectorized scoring backend for the queries of question 2.3. The inverted index tfidf is kept as a
+sparse doc-term matrix (one row per doc id, one column per term id) with rows normalized to unit length, so that the
+cosine similarity of every document with a query is a single sparse matrix-vector product, and the first k documents
+are chosen with 'np.argpartition' instead of a heap.
+Unlike 'engine.top_k_documents', which fits a new TfidfVectorizer on the query alone, the query words are weighted with
+the idf of the index itself (the same formula used to build the index), so query and documents live in the same space.
+As in the rest of the engine, only the documents containing all the words of the query are returned.
+'''
+
+# import config
+from functions.config import *
+from functions import engine
+from functions import corpus
+
+# import libraries
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+class SparseScorer:
+    '''
+    Scorer built from vocabulary and inverted index tfidf (dictionaries or binary files). Build it once and use it for
+    all the queries: 'top_k' for a single query, 'top_k_batch' for many of them, 'search' for a dataframe as the one of
+    'engine.top_k_documents'.
+    '''
+
+    # queries scored together by 'top_k_batch', as the scores of a block take n_docs * batch_size floats
+    batch_size = 256
+
+    def __init__(self, vocabulary, inverted_index_tfidf):
+        self.vocabulary = vocabulary
+
+        rows = []
+        cols = []
+        scores = []
+        for term_id, (docs, term_scores) in inverted_index_tfidf.items():
+            rows.append(np.asarray(docs, dtype = np.int64))
+            cols.append(np.full(len(docs), term_id, dtype = np.int64))
+            scores.append(np.asarray(term_scores, dtype = np.float64))
+
+        rows = np.concatenate(rows) if len(rows) > 0 else np.zeros(0, dtype = np.int64)
+        cols = np.concatenate(cols) if len(cols) > 0 else np.zeros(0, dtype = np.int64)
+        scores = np.concatenate(scores) if len(scores) > 0 else np.zeros(0)
+        n_docs = int(rows.max()) + 1 if len(rows) > 0 else 1
+        n_terms = max(int(cols.max()) if len(cols) > 0 else 0, max((term_id for _, term_id in vocabulary.items()), default = 0)) + 1
+
+        # idf of every term, as computed when the index was created
+        document_frequency = np.bincount(cols, minlength = n_terms)
+        self.idf = np.log(n_courses / (document_frequency + 1))
+
+        # the matrices are built directly in csr form, so that the zero scores (that still mean that the term is in the
+        # document) are kept: 'presence' has the same structure of 'weights' with all ones
+        order = np.lexsort((cols, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        indptr = np.zeros(n_docs + 1, dtype = np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows, minlength = n_docs))
+
+        norms = np.sqrt(np.bincount(rows, weights = scores * scores, minlength = n_docs))
+        normalized = np.divide(scores, norms[rows], out = np.zeros(len(scores)), where = norms[rows] != 0)
+        self.weights = sparse.csr_matrix((normalized, cols, indptr), shape = (n_docs, n_terms))
+        self.presence = sparse.csr_matrix((np.ones(len(cols)), cols, indptr), shape = (n_docs, n_terms))
+
+    def query_vectors(self, queries):
+        '''
+        Return the unit tf-idf vectors of the queries (a sparse matrix with a row per query), their words as a 0/1
+        matrix, and the number of distinct words of every query, -1 when a word is not in the vocabulary and the query
+        cannot match any document.
+        '''
+
+        rows = []
+        cols = []
+        tfs = []
+        required = np.zeros(len(queries), dtype = np.int64)
+        for i, query in enumerate(queries):
+            counts = {}
+            for w in engine.analyzer.analyze(query):
+                term_id = self.vocabulary.get(w)
+                if term_id is None:
+                    counts = None
+                    break
+                counts[term_id] = counts.get(term_id, 0) + 1
+
+            if counts is None:
+                required[i] = -1
+                continue
+            required[i] = len(counts)
+            rows += [i] * len(counts)
+            cols += list(counts)
+            tfs += list(counts.values())
+
+        cols = np.asarray(cols, dtype = np.int64)
+        weights = np.asarray(tfs, dtype = np.float64) * self.idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights = weights * weights, minlength = len(queries)))
+        weights = np.divide(weights, norms[rows], out = np.zeros(len(weights)), where = norms[rows] != 0)
+
+        shape = (len(queries), self.weights.shape[1])
+        query_weights = sparse.csr_matrix((weights, (rows, cols)), shape = shape)
+        query_words = sparse.csr_matrix((np.ones(len(cols)), (rows, cols)), shape = shape)
+        return query_weights, query_words, required
+
+    def top_k_batch(self, queries, k = 5):
+        '''
+        Return, for every query, the list of the (doc id, score) pairs of the first 'k' documents (all of them if k = "all")
+        containing all the words of the query, by decreasing score and then increasing doc id.
+        '''
+
+        results = []
+        for start in range(0, len(queries), self.batch_size):
+            query_weights, query_words, required = self.query_vectors(queries[start:start + self.batch_size])
+
+            # a column per query: the cosine similarities and the number of words of the query in every document
+            scores = (self.weights @ query_weights.T).toarray()
+            matches = (self.presence @ query_words.T).toarray()
+
+            for j in range(len(required)):
+                if required[j] <= 0:
+                    results.append([])
+                    continue
+
+                docs = np.flatnonzero(matches[:, j] == required[j])
+                doc_scores = scores[docs, j]
+                if k != "all" and k < len(docs):
+                    if k <= 0:
+                        results.append([])
+                        continue
+                    # every document scoring as the k-th one is kept, the ties are broken by doc id below
+                    kth = doc_scores[np.argpartition(-doc_scores, k - 1)[k - 1]]
+                    selected = doc_scores >= kth
+                    docs, doc_scores = docs[selected], doc_scores[selected]
+
+                order = np.lexsort((docs, -doc_scores))
+                if k != "all":
+                    order = order[:k]
+                results.append(list(zip(docs[order].tolist(), doc_scores[order].tolist())))
+
+        return results
+
+    def top_k(self, query, k = 5):
+        '''
+        The same as 'top_k_batch' for a single query.
+        '''
+
+        return self.top_k_batch([query], k)[0]
+
+    def search(self, query, k = 5):
+        '''
+        Return the first 'k' documents of the query as the dataframe of 'engine.top_k_documents'.
+        '''
+
+        ranked = self.top_k(query, k)
+        columns = ['courseName', 'universityName', 'description', 'url']
+        doc_ids = [doc_id for doc_id, _ in ranked]
+        if corpus.corpus_available():
+            rows = corpus.get_rows(doc_ids, columns)
+        else:
+            rows = [corpus.read_tsv(doc_id) for doc_id in doc_ids]
+
+        result_documents = [{'similarityScore': score, **{column: row[column] for column in columns}} for (_, score), row in zip(ranked, rows)]
+        return pd.DataFrame(result_documents, columns = ['similarityScore'] + columns)
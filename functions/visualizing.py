@@ -1,6 +1,7 @@
 # import config
 from functions.config import *
 from functions import engine
+from functions import corpus
 
 # import libraries
 import os
@@ -15,6 +16,14 @@ def load_all_courses():
     '''
     This method create a dataframe containing all the courses of our dataset.
     '''
+    # fast path: a single read from the corpus store, missing values become NaN and fees numbers as 'read_csv' does
+    if corpus.corpus_available():
+        courses_df = corpus.load_corpus().drop(columns = ["course_id"]).replace("", np.nan)
+        if "fees (EUR)" in courses_df.columns:
+            # as in the concatenation below the new column goes last
+            courses_df["fees (EUR)"] = pd.to_numeric(courses_df.pop("fees (EUR)"))
+        return courses_df.dropna(subset = ["courseName"])
+
     # load courses dataset
     courses_columns = ["courseName", "universityName", "facultyName", "isItFullTime", "description", "startDate", "fees", "modality", "duration", "city", "country", "administration", "url"]
     courses_df = pd.DataFrame(columns = courses_columns)
@@ -51,7 +60,8 @@ def get_coordinates_table(api_key):
         # we check the coordinates of every university
         for group_name, group in tqdm(grouped, total = len(grouped)):
             location_string = group_name[0] + ", " + group_name[1] + ", " + group_name[2] # compose the address
-            geolocator = Bing(api_key = api_key) # give the geolocator the api key
+            scheme, domain = service_urls["geocoding"].split("://") # the service can be redirected to a local server
+            geolocator = Bing(api_key = api_key, scheme = scheme, domain = domain) # give the geolocator the api key
             location = geolocator.geocode(location_string, timeout = None) # execute the geolocation
 
             # create new row and insert entry ti dataframe